@@ -0,0 +1,45 @@
+"""
+Параллельные обращения и сбросы одного кулера на локальной замене Mongo (mongomock-motor).
+Проверяет, что обращение регистрируется ровно один раз и уведомления не теряются.
+Запуск: python -m bench.cooler_state_stress --workers 200
+"""
+import argparse
+import asyncio
+
+from pymotyc import Engine
+
+from database import Database, cooler_state, notifications
+from database.models import Cooler
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=200)
+    args = parser.parse_args()
+
+    from mongomock_motor import AsyncMongoMockClient
+    await Engine().bind(motor=AsyncMongoMockClient(), databases=[Database], inject_motyc_fields=True)
+    uid = str((await Database.coolers.save(Cooler(name="stress"), inject_default_id=True))._id)
+
+    async def report(i):
+        cooler = await cooler_state.mark_empty(uid, "no_water")
+        incident_id = await cooler_state.get_incident_id(uid)
+        await notifications.add(uid, incident_id, [(i, i)])
+        return cooler is not None
+
+    accepted = sum(await asyncio.gather(*[report(i) for i in range(args.workers)]))
+    incident_id = await cooler_state.get_incident_id(uid)
+    sent = sum([len(i) async for i in notifications.batches(uid, incident_id)])
+    assert accepted == 1, f"accepted {accepted} reports"
+    assert sent == args.workers, f"lost {args.workers - sent} notifications"
+
+    await asyncio.gather(*[notifications.remove([(i, i)]) for i in range(0, args.workers, 2)],
+                         cooler_state.reset(uid, "reset_water"))
+    sent = sum([len(i) async for i in notifications.batches(uid, incident_id)])
+    cooler = await Database.coolers.find_one(_id=uid)
+    assert sent == args.workers // 2 and not cooler.empty_watter
+    print(f"ok: {args.workers} concurrent reports, 1 accepted, no notifications lost")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,57 @@
+"""
+Сравнение последовательной рассылки и Dispatcher на локальной подделке Bot API.
+Запуск: python -m bench.dispatcher_bench --recipients 200 --latency 0.05
+"""
+import argparse
+import asyncio
+import time
+
+# noinspection PyPackageRequirements
+from telebot.async_telebot import AsyncTeleBot
+# noinspection PyPackageRequirements
+from telebot.asyncio_helper import ApiTelegramException
+
+from bench.fake_bot_api import FakeBotApi
+from utils import Dispatcher
+
+
+async def sequential(bot, recipients):
+    for i in recipients:
+        try:
+            await bot.send_photo(i, "photo", "caption")
+        except ApiTelegramException:
+            pass
+
+
+async def concurrent(bot, recipients, concurrency):
+    # Лимиты подняты, чтобы мерить только саму рассылку, а не ожидание в ведрах
+    dispatcher = Dispatcher(concurrency, global_rate=10 ** 6, private_rate=10 ** 6, group_rate=10 ** 6)
+    await asyncio.gather(*[dispatcher.call(bot.send_photo, i, "photo", "caption") for i in recipients],
+                         return_exceptions=True)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    api = FakeBotApi(latency=args.latency)
+    await api.start()
+    bot = AsyncTeleBot("0:bench")
+    recipients = list(range(1, args.recipients + 1))
+
+    try:
+        for name, job in (("sequential", sequential(bot, recipients)),
+                          ("dispatcher", concurrent(bot, recipients, args.concurrency))):
+            start = time.perf_counter()
+            await job
+            print(f"{name}: {time.perf_counter() - start:.2f}s for {args.recipients} recipients")
+    finally:
+        await bot.close_session()
+        await api.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
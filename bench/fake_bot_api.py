@@ -0,0 +1,100 @@
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from urllib.parse import parse_qsl
+
+from aiohttp import web
+# noinspection PyPackageRequirements
+from telebot import asyncio_helper
+
+
+class FakeBotApi:
+    """
+    Локальная подделка Bot API для бенчмарков.
+    latency — задержка ответа в секундах, flood_rate — доля ответов 429 с retry_after.
+    calls — количество вызовов по методам, uploaded — загруженные байты по методам.
+    blocked — чаты, отправка в которые завершается 403, как после блокировки бота.
+    sent — (токен, метод, chat_id, текст) всех вызовов send*: по токену видно, какая реплика отправила сообщение.
+    """
+
+    def __init__(self, latency=0.05, flood_rate=0.0, retry_after=1, host="127.0.0.1", port=8081):
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.host = host
+        self.port = port
+        self.calls = Counter()
+        self.uploaded = Counter()
+        self.blocked = set()
+        self.sent = []
+        self.message_id = 0
+        self.runner = None
+
+        self.app = web.Application(client_max_size=50 * 1024 ** 2)  # Лимит телеграма на документы
+        self.app.router.add_route("*", "/bot{token}/{method}", self.handle)
+
+    @property
+    def api_url(self):
+        return f"http://{self.host}:{self.port}/bot{{0}}/{{1}}"
+
+    async def handle(self, request: web.Request):
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        params = await request.post()
+        if not params and request.can_read_body:
+            # Часть методов telebot отправляет GET-запросом с формой в теле, request.post() её не читает
+            params = dict(parse_qsl(await request.text()))
+        for value in params.values():
+            if isinstance(value, web.FileField):
+                self.uploaded[method] += len(value.file.read())
+        if method.startswith("send"):
+            self.sent.append((request.match_info["token"], method, int(params.get("chat_id", 0)), params.get("text")))
+        await asyncio.sleep(self.latency)
+
+        if self.flood_rate and random.random() < self.flood_rate:
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after}
+            })
+
+        if method.startswith("send") and int(params.get("chat_id", 0)) in self.blocked:
+            return web.json_response({
+                "ok": False,
+                "error_code": 403,
+                "description": "Forbidden: bot was blocked by the user"
+            })
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "FakeBot"}
+        elif method == "getUpdates":
+            result = []
+        elif method in ("deleteMessage", "answerCallbackQuery", "setWebhook", "deleteWebhook"):
+            result = True
+        else:
+            self.message_id += 1
+            chat_id = int(params.get("chat_id", 0))
+            result = {
+                "message_id": int(params.get("message_id", self.message_id)),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            }
+            if "document" in params:
+                # Отправка по file_id возвращает тот же file_id
+                file_id = params["document"] if isinstance(params["document"], str) else f"doc{self.message_id}"
+                result["document"] = {"file_id": file_id, "file_unique_id": file_id}
+            if "reply_markup" in params:
+                result["reply_markup"] = json.loads(params["reply_markup"])
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        asyncio_helper.API_URL = self.api_url
+
+    async def stop(self):
+        await self.runner.cleanup()
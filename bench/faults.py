@@ -0,0 +1,132 @@
+"""
+Деградация при проблемах с БД: всплеск задержек, недоступность и восстановление на mongomock-motor
+с внедрёнными ошибками. Проверяет, что бот отвечает из последнего известного состояния, не ждёт
+таймаутов при разомкнутом автомате, а обращения, принятые во время сбоя, регистрируются после восстановления.
+Сбой на записи события, случая или outbox: повтор продолжает обращение с этого шага без дублей.
+Запуск: python -m bench.faults
+Код выхода 1, если какая-то проверка не прошла.
+"""
+import asyncio
+import json
+import sys
+import time
+from os import environ
+
+from bench.harness import boot, inject_faults, faults, message_update, callback_update
+
+DB_TIMEOUT = 0.3
+RESET_AFTER = 1.0
+
+
+async def main():
+    environ.setdefault("DB_TIMEOUT", str(DB_TIMEOUT))
+    environ.setdefault("DB_FAILURES", "2")
+    environ.setdefault("DB_RESET_AFTER", str(RESET_AFTER))
+    environ.setdefault("REPLAY_INTERVAL", "0.2")
+    environ.setdefault("INCIDENT_WINDOW", "0.1")
+    inject_faults()
+    app, api = await boot(latency=0.001)
+
+    from telebot.types import Update  # noqa
+    from database import Database, ensure_indexes, breaker
+    from database.models import Cooler, User
+    from utils import CallbackData
+
+    await ensure_indexes()
+    await Database.users.save(User(telegram_id=900, name="admin", admin=True, send_notif=True))
+    cooler = str((await Database.coolers.save(Cooler(name="faults"), inject_default_id=True))._id)
+    app.replay_queue.start()
+    await app.recipients.refresh()
+
+    async def process(update: dict) -> float:
+        start = time.perf_counter()
+        await app.bot.process_new_updates([Update.de_json(update)])
+        return time.perf_counter() - start
+
+    checks = {}
+    timings = {}
+
+    # Обычная работа: пользователь и кулер попадают в кэши
+    await process(message_update(5, f"/start {cooler}"))
+
+    # Всплеск задержек: запросы упираются в таймаут, ответы идут из последнего известного состояния
+    faults.latency = 2
+    api.calls.clear()
+    timings["slow"] = [await process(message_update(5, f"/start {cooler}")) for _ in range(3)]
+    checks["answered during latency spike"] = api.calls["sendMessage"] == 3
+    checks["bounded by timeout"] = max(timings["slow"]) < DB_TIMEOUT + 0.2
+    checks["breaker opened"] = breaker.open
+
+    # Недоступность: новый пользователь обслуживается без записи, обращение ставится в очередь
+    faults.latency = 0
+    faults.down = True
+    api.calls.clear()
+    timings["down"] = [
+        await process(message_update(6, f"/start {cooler}")),
+        await process(callback_update(6, CallbackData("no_water", cooler).encode())),
+        await process(message_update(6, photo=True)),
+    ]
+    checks["answered during outage"] = api.calls["sendMessage"] == 2 and api.calls["answerCallbackQuery"] == 1
+    checks["no waiting while open"] = max(timings["down"]) < 0.1
+    checks["report queued"] = len(app.replay_queue.items) == 1
+
+    # Восстановление: автомат замыкается, обращение регистрируется и рассылается
+    faults.down = False
+    await asyncio.sleep(RESET_AFTER + 1)
+    state = await Database.coolers.find_one(_id=cooler, inject_default_id=True)
+    checks["breaker closed"] = not breaker.open
+    checks["report replayed"] = state.empty_watter and not app.replay_queue.items
+    checks["notification sent"] = api.calls["sendPhoto"] == 1
+
+    # Сбой на одном шаге обращения: повтор продолжает с этого шага, не дублируя случай и событие
+    async def resume(name: str, user_id: int, fault: tuple[str, str]) -> dict:
+        uid = str((await Database.coolers.save(Cooler(name=name), inject_default_id=True))._id)
+        await process(callback_update(user_id, CallbackData("no_water", uid).encode()))
+        api.calls.clear()
+        faults.fail[fault] = 1
+        await process(message_update(user_id, photo=True))
+        queued = len(app.replay_queue.items)
+        for _ in range(20):
+            await asyncio.sleep(0.1)
+            if api.calls["sendPhoto"] and not app.replay_queue.items:
+                break
+        await app.event_sink.flush()
+        await app.event_sink.flush()  # Сбой записи событий оставляет их в буфере до следующего сброса
+        incident = await Database.incidents.collection.find({"cooler_id": uid}).to_list(None)
+        return {
+            "queued": queued,
+            "incidents": len(incident),
+            "reports": sum(i["reports"] for i in incident),
+            "events": await Database.events.collection.count_documents({"cooler_id": uid}),
+            "sent": api.calls["sendPhoto"],
+            "pending": len(app.replay_queue.items),
+        }
+
+    resumed = {
+        "event": await resume("event", 7, ("events", "insert_many")),
+        "incident": await resume("incident", 8, ("incidents", "find_one_and_update")),
+        "outbox": await resume("outbox", 9, ("outbox", "bulk_write")),
+    }
+    for step, i in resumed.items():
+        checks[f"resumed after {step} failure"] = \
+            i["queued"] == (step != "event") and i["incidents"] == i["reports"] == i["events"] == i["sent"] == 1 \
+            and not i["pending"]
+
+    result = {
+        "timings_ms": {k: [round(i * 1000, 1) for i in v] for k, v in timings.items()},
+        "breaker_rejected": breaker.rejected,
+        "replayed": app.replay_queue.replayed,
+        "resumed": resumed,
+        "checks": checks,
+    }
+    print(json.dumps(result, indent=2))
+
+    await app.replay_queue.stop()
+    await app.outbox_worker.stop()
+    await app.bot.close_session()
+    await api.stop()
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+import asyncio
+import time
+from collections import Counter
+from itertools import count
+from os import environ
+
+from bench.fake_bot_api import FakeBotApi
+
+_ids = count(1)
+
+DB_METHODS = ("find", "find_one", "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+              "delete_one", "delete_many", "find_one_and_update", "find_one_and_delete", "bulk_write", "aggregate",
+              "count_documents")
+db_ops = Counter()  # (коллекция, метод) -> количество запросов, заполняется после count_db_ops()
+
+
+def count_db_ops():
+    # Оборачивает методы коллекций mongomock-motor, чтобы считать запросы к БД
+    from mongomock_motor import AsyncMongoMockCollection
+
+    for name in DB_METHODS:
+        original = getattr(AsyncMongoMockCollection, name, None)
+        if original is None or getattr(original, "counted", False):
+            continue
+
+        def wrapper(self, *args, _original=original, _name=name, **kwargs):
+            db_ops[(self.name, _name)] += 1
+            return _original(self, *args, **kwargs)
+
+        wrapper.counted = True
+        setattr(AsyncMongoMockCollection, name, wrapper)
+
+
+class Faults:
+    latency = 0.0  # Задержка каждого запроса к БД в секундах
+    down = False  # Все запросы завершаются ServerSelectionTimeoutError
+
+    def __init__(self):
+        self.fail = Counter()  # (коллекция, метод) -> сколько следующих вызовов завершить ServerSelectionTimeoutError
+
+
+faults = Faults()
+
+
+def inject_faults():
+    # Оборачивает методы коллекций и курсоров mongomock-motor, чтобы изображать медленную или недоступную БД
+    from mongomock_motor import AsyncMongoMockCollection, AsyncCursor, AsyncCommandCursor
+    from pymongo.errors import ServerSelectionTimeoutError
+
+    targets = [(AsyncMongoMockCollection, [i for i in DB_METHODS if i not in ("find", "aggregate")]),
+               (AsyncCursor, ["to_list", "next", "__anext__"]), (AsyncCommandCursor, ["to_list", "next", "__anext__"])]
+    for cls, names in targets:
+        for name in names:
+            original = getattr(cls, name, None)
+            if original is None or getattr(original, "faulty", False):
+                continue
+
+            async def wrapper(self, *args, _original=original, _name=name, **kwargs):
+                if faults.down:
+                    raise ServerSelectionTimeoutError("Injected outage")
+                key = (getattr(self, "name", None), _name)
+                if faults.fail[key]:
+                    faults.fail[key] -= 1
+                    raise ServerSelectionTimeoutError(f"Injected failure in {key[0]}.{key[1]}")
+                if faults.latency:
+                    await asyncio.sleep(faults.latency)
+                return await _original(self, *args, **kwargs)
+
+            wrapper.faulty = True
+            setattr(cls, name, wrapper)
+
+
+async def boot(latency=0.01, flood_rate=0.0, port=8081):
+    """
+    Поднимает подделку Bot API, подключает Database к mongomock-motor, импортирует main, вызывает create_app()
+    и запускает outbox_worker.
+    Возвращает (модуль main, FakeBotApi).
+    """
+    environ.setdefault("TELEBOT_TOKEN", "0:bench")
+    environ.setdefault("DATABASE_URL", "mongodb://127.0.0.1:27017")
+
+    from mongomock_motor import AsyncMongoMockClient
+    from pymotyc import Engine
+
+    import main
+    from database import Database
+
+    main.create_app()
+
+    api = FakeBotApi(latency=latency, flood_rate=flood_rate, port=port)
+    await api.start()
+    await Engine().bind(motor=AsyncMongoMockClient(), databases=[Database], inject_motyc_fields=True,
+                        already_bound="skip")
+    main.outbox_worker.start()
+    return main, api
+
+
+def user(uid: int) -> dict:
+    return {"id": uid, "is_bot": False, "first_name": f"user{uid}", "username": f"user{uid}"}
+
+
+def message_update(uid: int, text: str = None, chat_id: int = None, chat_type="private", photo=False) -> dict:
+    message = {
+        "message_id": next(_ids),
+        "date": int(time.time()),
+        "chat": {"id": chat_id or uid, "type": chat_type},
+        "from": user(uid),
+    }
+    if text:
+        message["text"] = text
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    if photo:
+        message["photo"] = [
+            {"file_id": "photo_small", "file_unique_id": "s", "width": 90, "height": 90},
+            {"file_id": "photo_big", "file_unique_id": "b", "width": 1280, "height": 960},
+        ]
+    return {"update_id": next(_ids), "message": message}
+
+
+def callback_update(uid: int, data: str, chat_id: int = None, chat_type="private", keyboard: list = None) -> dict:
+    return {"update_id": next(_ids), "callback_query": {
+        "id": str(next(_ids)),
+        "chat_instance": "bench",
+        "data": data,
+        "from": user(uid),
+        "message": {
+            "message_id": next(_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id or uid, "type": chat_type},
+            "reply_markup": {"inline_keyboard": keyboard or []},
+        },
+    }}
@@ -0,0 +1,98 @@
+"""
+Микробенчмарк чтения моделями pymotyc и записями из database.projections.
+Сравниваются разбор уже полученных документов (только CPU) и чтение через mongomock-motor целиком:
+время на операцию и пик выделенной памяти (tracemalloc) в пересчёте на операцию для пользователя и для кулера с длинным старым sent_messages.
+Запуск: python -m bench.projections_bench [--count 20000] [--sent 200]
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+# noinspection PyPackageRequirements
+from bson import ObjectId
+
+
+def user_document(i: int) -> dict:
+    return {"_id": ObjectId(), "telegram_id": 10 ** 9 + i, "name": f"user{i}", "send_notif": i % 10 == 0,
+            "banned": False, "banned_until": None, "admin": i % 10 == 0, "can_add_admin": False}
+
+
+def cooler_document(i: int, sent: int) -> dict:
+    # Кулеры до переноса уведомлений в notifications хранили все отправленные сообщения в документе
+    return {"_id": ObjectId(), "name": f"Кулер {i}, этаж {i % 9}", "empty_watter": True, "empty_glass": False,
+            "incident_id": str(ObjectId()),
+            "sent_messages": [{"chat_id": 10 ** 9 + j, "message_id": j} for j in range(sent)]}
+
+
+async def measure(name: str, count: int, job):
+    # Время и память меряются отдельными проходами: tracemalloc сильно замедляет выделения
+    async def run():
+        result = job()
+        if asyncio.iscoroutine(result):
+            await result
+
+    start = time.perf_counter()
+    await run()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    await run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:>24}: {elapsed / count * 1e6:8.1f} us/op  peak {peak / count:8.0f} B/op")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--sent", type=int, default=200, help="длина sent_messages в документе кулера")
+    args = parser.parse_args()
+
+    from mongomock_motor import AsyncMongoMockClient
+    from pymotyc import Engine
+
+    from database import Database, projections, UserRecord, CoolerRecord
+
+    await Engine().bind(motor=AsyncMongoMockClient(), databases=[Database], inject_motyc_fields=True)
+    users = [user_document(i) for i in range(1000)]
+    coolers = [cooler_document(i, args.sent) for i in range(100)]
+    await Database.users.collection.insert_many(users)
+    await Database.coolers.collection.insert_many(coolers)
+
+    print("Разбор документа:")
+    for title, documents, collection, record in (("user", users, Database.users, UserRecord),
+                                                 ("cooler", coolers, Database.coolers, CoolerRecord)):
+        sample = [documents[i % len(documents)] for i in range(args.count)]
+        await measure(f"{title} model", args.count,
+                lambda: [collection.parse_document(dict(i), inject_default_id=True) for i in sample])
+        await measure(f"{title} record", args.count, lambda: [projections.parse(record, i) for i in sample])
+
+    print("Чтение через драйвер:")
+    count = args.count // 10
+    telegram_ids = [users[i % len(users)]["telegram_id"] for i in range(count)]
+    cooler_ids = [coolers[i % len(coolers)]["_id"] for i in range(count)]
+
+    async def users_model():
+        for i in telegram_ids:
+            await Database.users.find({"telegram_id": i}, inject_default_id=True, limit=1)
+
+    async def users_record():
+        for i in telegram_ids:
+            await projections.find_one(Database.users, UserRecord, {"telegram_id": i})
+
+    async def coolers_model():
+        for i in cooler_ids:
+            await Database.coolers.find_one(_id=i, inject_default_id=True)
+
+    async def coolers_record():
+        for i in cooler_ids:
+            await projections.find_one(Database.coolers, CoolerRecord, {"_id": i})
+
+    await measure("user find model", count, users_model)
+    await measure("user find record", count, users_record)
+    await measure("cooler find_one model", count, coolers_model)
+    await measure("cooler find_one record", count, coolers_record)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
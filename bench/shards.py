@@ -0,0 +1,237 @@
+"""
+Три реплики бота в одном процессе: webhook-серверы с разбиением обновлений, выбор ведущей реплики по аренде,
+общее состояние диалогов и сброс кэшей пользователей между репликами.
+У каждой реплики свои копии модулей main, database и utils (кэши, автомат, аренда, очереди), общая только БД:
+mongomock-motor, а с DATABASE_URL — настоящая Mongo. На mongomock change streams нет, поэтому реплики
+опрашивают получателей и держат кэши пользователей только для деградации; с replica set кэши сбрасывает change stream.
+Bot API подменяется локальной подделкой, реплики различаются по токену.
+Запуск: python -m bench.shards [--updates 300] [--mongo mongodb://127.0.0.1:27017/?replicaSet=rs0]
+Код выхода 1, если какая-то проверка не прошла.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass
+from os import environ
+from types import ModuleType
+
+from aiohttp import ClientSession
+
+from bench.fake_bot_api import FakeBotApi
+from bench.harness import message_update, callback_update
+
+SHARDS = 3
+ADMIN = 900  # Реплика 0
+APP_PACKAGES = ("main", "database", "utils")
+
+
+@dataclass
+class Replica:
+    index: int
+    app: ModuleType  # main этой реплики
+    database: ModuleType
+    webhook: ModuleType
+    server: object = None
+
+
+def load_replica(index: int, env: dict) -> Replica:
+    # Свежий импорт модулей приложения: глобальное состояние реплики не пересекается с остальными
+    for name in [i for i in sys.modules if i.split(".")[0] in APP_PACKAGES]:
+        del sys.modules[name]
+    environ.update(env)
+    app = importlib.import_module("main")
+    replica = Replica(index, app, importlib.import_module("database"), importlib.import_module("utils.webhook"))
+    app.create_app()
+    app.leader.owner = f"shard{index}"  # hostname:pid у реплик в одном процессе совпадает
+    return replica
+
+
+async def start(replica: Replica, client, urls: list[str], port: int):
+    # То же, что main.main(), но с адресом и портом этой реплики
+    from pymotyc import Engine
+
+    app = replica.app
+    await Engine().bind(motor=client, databases=[app.Database], inject_motyc_fields=True)
+    await app.ensure_indexes()
+    app.event_sink.start()
+    app.chat_sink.start()
+    app.replay_queue.start()
+    app.recipients.start()
+    app.leader.start()
+    webhook = replica.webhook
+    pool = webhook.UpdateWorkerPool(app.bot, 8, 1024)
+    replica.server = webhook.WebhookServer(app.bot, pool, "127.0.0.1", port, "/webhook",
+                                           shards=webhook.Shards(SHARDS, replica.index, urls))
+    await replica.server.start(urls[replica.index])
+
+
+async def stop(replica: Replica, crash=False):
+    # crash — реплика пропадает, не освобождая аренду; иначе останавливается как main.main()
+    app = replica.app
+    await replica.server.stop()
+    if crash:
+        await app.leader.renewal.stop()
+        if app.leader.is_leader:
+            await app.stop_jobs()
+    else:
+        await app.leader.stop()
+    app.recipients.task.cancel()
+    await asyncio.gather(app.recipients.task, return_exceptions=True)
+    await app.event_sink.stop()
+    await app.chat_sink.stop()
+    await app.replay_queue.stop()
+    replica.server = None
+
+
+async def quiet(api: FakeBotApi, period=0.5, timeout=30):
+    # Ждём, пока реплики перестанут отправлять сообщения
+    deadline = time.monotonic() + timeout
+    count = -1
+    while count != len(api.sent) and time.monotonic() < deadline:
+        count = len(api.sent)
+        await asyncio.sleep(period)
+
+
+async def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if await condition():
+            return True
+        await asyncio.sleep(0.1)
+    return False
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=300)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--mongo", default=environ.get("DATABASE_URL"), help="настоящая Mongo вместо mongomock")
+    args = parser.parse_args()
+
+    environ.setdefault("DATABASE_URL", "mongodb://127.0.0.1:27017")  # Клиент из create_app() не используется
+    if args.mongo:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        environ["DB_NAME"] = f"bench_shards_{os.getpid()}"  # До импорта database
+        client = AsyncIOMotorClient(args.mongo)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient()
+
+    api = FakeBotApi(latency=0.001, port=args.api_port)
+    await api.start()
+
+    urls = [f"http://127.0.0.1:{args.port + i}" for i in range(SHARDS)]
+    replicas = [load_replica(i, {
+        "TELEBOT_TOKEN": f"{i}:shard",
+        "SHARD_COUNT": str(SHARDS),
+        "LEADER_TTL": "1",
+        "INCIDENT_WINDOW": "0.2",
+        "RECIPIENTS_POLL": "1",
+        "REPLAY_INTERVAL": "0.2",
+    }) for i in range(SHARDS)]
+    for i in replicas:
+        await start(i, client, urls, args.port + i.index)
+
+    Database = replicas[0].app.Database
+    leases = replicas[0].database.leases
+    for i in range(3):
+        await Database.users.save(replicas[0].app.User(telegram_id=ADMIN + i, name="admin", admin=True,
+                                                       send_notif=True))
+    cooler = str((await Database.coolers.save(replicas[0].app.Cooler(name="shards"), inject_default_id=True))._id)
+    CallbackData = replicas[0].app.CallbackData
+
+    def shard_of(token: str) -> int:
+        return int(token.split(":")[0])
+
+    async def leader() -> int | None:
+        holder = await leases.holder("jobs")
+        return None if holder is None else int(holder.removeprefix("shard"))
+
+    checks = {}
+    async with ClientSession() as session:
+        async def post(shard: int, update: dict) -> int:
+            async with session.post(urls[shard] + "/webhook", json=update) as response:
+                return response.status
+
+        async def elected() -> bool:
+            return await leader() is not None
+
+        checks["leader elected"] = await wait_for(elected, 10)
+
+        # Балансировщик раскидывает обновления по репликам случайно, отвечает владелец пользователя
+        statuses = await asyncio.gather(*[
+            post(random.randrange(SHARDS), message_update(random.randint(1, args.users), f"/start {cooler}"))
+            for _ in range(args.updates)
+        ])
+        await quiet(api)
+        replies = [(shard_of(token), chat_id) for token, method, chat_id, _ in api.sent if method == "sendMessage"]
+        checks["all accepted"] = all(i == 200 for i in statuses)
+        checks["routed to owner"] = bool(replies) and all(chat_id % SHARDS == n for n, chat_id in replies)
+        forwarded = sum(i.server.forwarded for i in replicas)
+
+        # Бан на реплике админа должен действовать на реплике пользователя, которая уже загрузила его запись
+        user = next(i for i in range(10 ** 5, 10 ** 5 + SHARDS) if i % SHARDS != ADMIN % SHARDS)
+        await post(user % SHARDS, message_update(user, f"/start {cooler}"))
+        await quiet(api)
+        await post(ADMIN % SHARDS, message_update(ADMIN, f"/ban {user}"))
+        await quiet(api)
+        await post(user % SHARDS, message_update(user, f"/start {cooler}"))
+        await quiet(api)
+        answers = [text for _, method, chat_id, text in api.sent if chat_id == user and method == "sendMessage"]
+        checks["ban seen by other replica"] = answers[-1:] == ["Вы находитесь в черном списке"]
+
+        # Владелец пользователя падает между нажатием кнопки и фотографией
+        reporter = user + SHARDS
+        owner = reporter % SHARDS
+        await post(owner, callback_update(reporter, CallbackData("no_water", cooler).encode()))
+        await quiet(api)
+        await stop(replicas[owner], crash=True)
+        other = (owner + 1) % SHARDS
+        checks["accepted while owner is down"] = await post(other, message_update(reporter, photo=True)) == 200
+        await quiet(api)
+        checks["state shared"] = (await Database.coolers.find_one(_id=cooler)).empty_watter
+
+    # Ведущая реплика останавливается, аренду забирает живая
+    alive = {i.index for i in replicas if i.server is not None}
+    current = await leader()
+    if current in alive:
+        await stop(replicas[current])
+        alive.discard(current)
+
+    async def new_leader() -> bool:
+        return await leader() in alive
+
+    checks["leader failover"] = await wait_for(new_leader, 10)
+
+    async def notified() -> bool:
+        return api.calls["sendPhoto"] == 3
+
+    checks["notifications sent"] = await wait_for(notified, 10)
+
+    result = {
+        "database": "mongo" if args.mongo else "mongomock",
+        "replies": [sum(1 for n, _ in replies if n == i) for i in range(SHARDS)],
+        "forwarded": forwarded,
+        "checks": checks,
+    }
+    print(json.dumps(result, indent=2))
+
+    for i in replicas:
+        if i.server is not None:
+            await stop(i)
+    if args.mongo:
+        await client.drop_database(Database.__db__name__)
+    await replicas[0].app.bot.close_session()
+    await api.stop()
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
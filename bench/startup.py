@@ -0,0 +1,117 @@
+"""
+Время холодного старта: импорт main (python -X importtime) и время до первого обработанного обновления
+на подделке Bot API и mongomock-motor. Результаты сравниваются с бюджетом из startup_budget.json.
+Запуск: python -m bench.startup [--runs 5] [--json]
+Код выхода 1, если бюджет превышен или при импорте загрузились модули, которые должны грузиться лениво.
+"""
+import time
+
+_started = time.perf_counter()  # До любых импортов, чтобы дочерний процесс считал время с запуска
+
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+from os import environ
+from pathlib import Path
+
+BUDGET = Path(__file__).with_name("startup_budget.json")
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _env() -> dict:
+    env = dict(environ)
+    env.setdefault("TELEBOT_TOKEN", "0:bench")
+    env.setdefault("DATABASE_URL", "mongodb://127.0.0.1:27017")
+    env.pop("METRICS_PORT", None)
+    return env
+
+
+def import_profile() -> tuple[float, dict[str, float]]:
+    # Возвращает время импорта main в мс и накопленное время каждого модуля
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT, env=_env(),
+                            capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative) / 1000
+    return modules["main"], modules
+
+
+def first_update() -> dict:
+    result = subprocess.run([sys.executable, "-m", "bench.startup", "--child"], cwd=ROOT, env=_env(),
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+async def child():
+    import main
+    imported = time.perf_counter()
+
+    from bench.harness import boot, message_update
+    from database import Database
+    from database.models import Cooler
+    # noinspection PyPackageRequirements
+    from telebot.types import Update
+
+    _, api = await boot(latency=0)
+    cooler = str((await Database.coolers.save(Cooler(name="startup"), inject_default_id=True))._id)
+    ready = time.perf_counter()
+    await main.bot.process_new_updates([Update.de_json(message_update(1, f"/start {cooler}"))])
+    handled = time.perf_counter()
+    assert api.calls["sendMessage"], "first update was not answered"
+
+    await main.bot.close_session()
+    await api.stop()
+    print(json.dumps({
+        "import_ms": (imported - _started) * 1000,
+        "ready_ms": (ready - _started) * 1000,
+        "first_update_ms": (handled - _started) * 1000,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--child", action="store_true")
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(child())
+        return
+
+    budget = json.loads(BUDGET.read_text())
+    # Берём минимум из нескольких запусков, чтобы не ловить шум соседних процессов
+    profiles = [import_profile() for _ in range(args.runs)]
+    import_ms = min(i[0] for i in profiles)
+    modules = profiles[-1][1]
+    first = min((first_update() for _ in range(args.runs)), key=lambda i: i["first_update_ms"])
+
+    result = {
+        "import_main_ms": round(import_ms, 1),
+        "first_update_ms": round(first["first_update_ms"], 1),
+        "heaviest": {k: round(v, 1) for k, v in sorted(modules.items(), key=lambda i: -i[1])[1:11]},
+        "eager": [i for i in budget["lazy_modules"] if i in modules],
+    }
+
+    failed = [f"{k}: {result[k]} > {budget[k]}" for k in ("import_main_ms", "first_update_ms") if result[k] > budget[k]]
+    failed += [f"{i} is imported eagerly" for i in result["eager"]]
+
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print(f"import main: {result['import_main_ms']}ms (budget {budget['import_main_ms']}ms)")
+        print(f"first update: {result['first_update_ms']}ms (budget {budget['first_update_ms']}ms)")
+        for name, ms in result["heaviest"].items():
+            print(f"  {ms:8.1f}ms {name}")
+    for i in failed:
+        print(f"FAIL {i}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
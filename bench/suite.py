@@ -0,0 +1,256 @@
+"""
+Набор сценариев нагрузки на настоящих обработчиках из main.py, подделке Bot API и mongomock-motor.
+Сценарии: start_burst — сканирования /start, report_flood — обращения при N подписчиках,
+reset_storm — одновременные нажатия «загружено», coolers_qr — /coolers qr на много кулеров.
+Для каждого: пропускная способность, p50/p95/p99 задержки обработки, запросы к БД и вызовы телеграма на обновление.
+Время в mongomock растёт с размером коллекций быстрее, чем в настоящей Mongo, поэтому сравнивать между ревизиями
+стоит в первую очередь запросы к БД и вызовы телеграма на обновление.
+Запуск: python -m bench.suite [--scenario report_flood] [--subscribers 200] [--flood-rate 0.05] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from os import environ
+
+from bench.harness import boot, count_db_ops, db_ops, message_update, callback_update
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] * 1000 if values else 0
+
+
+class Scenario:
+    def __init__(self, app, api, args):
+        self.app = app
+        self.api = api
+        self.args = args
+        self.latencies = []
+        self.updates = 0
+
+    async def reset(self):
+        # Каждый сценарий начинается с пустой БД и холодных кэшей
+        from database import Database, users_cache, chats_cache
+
+        for name in Database.__annotations__:
+            await getattr(Database, name).collection.delete_many({})
+        users_cache.clear()
+        chats_cache.clear()
+        self.app.recipients.targets = None
+
+    async def subscribers(self, count: int, admin=True) -> list[int]:
+        from database import Database
+        from database.models import User
+
+        ids = list(range(10 ** 6, 10 ** 6 + count))
+        await Database.users.collection.insert_many([
+            User(telegram_id=i, name=f"admin{i}", admin=admin, send_notif=True).dict() for i in ids
+        ])
+        return ids
+
+    async def cooler(self, name="bench") -> str:
+        from database import Database
+        from database.models import Cooler
+
+        return str((await Database.coolers.save(Cooler(name=name), inject_default_id=True))._id)
+
+    async def feed(self, updates: list[dict]):
+        # Обновления обрабатываются параллельно с ограничением, как пулом webhook
+        from telebot.types import Update  # noqa
+
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def process(update):
+            async with semaphore:
+                start = time.perf_counter()
+                await self.app.bot.process_new_updates([Update.de_json(update)])
+                self.latencies.append(time.perf_counter() - start)
+
+        self.updates += len(updates)
+        await asyncio.gather(*[process(i) for i in updates])
+
+    async def settle(self):
+        # Ждём отложенные правки случаев и разбор outbox
+        from database import outbox
+
+        await asyncio.sleep(float(environ["INCIDENT_WINDOW"]) * 2)
+        while await outbox.pending():
+            await asyncio.sleep(0.05)
+
+    async def prepare(self):
+        pass
+
+    async def run(self):
+        raise NotImplementedError
+
+
+class StartBurst(Scenario):
+    async def prepare(self):
+        self.uid = await self.cooler()
+
+    async def run(self):
+        await self.feed([message_update(i, f"/start {self.uid}") for i in range(1, self.args.users + 1)])
+
+
+class ReportFlood(Scenario):
+    # Много людей сообщают об одном пустом кулере, уведомления получают subscribers подписчиков
+    async def prepare(self):
+        from utils import CallbackData
+
+        self.uid = await self.cooler()
+        await self.subscribers(self.args.subscribers)
+        reporters = range(1, self.args.reporters + 1)
+        await self.feed([callback_update(i, CallbackData("no_water", self.uid).encode()) for i in reporters])
+        self.latencies, self.updates = [], 0
+
+    async def run(self):
+        await self.feed([message_update(i, photo=True) for i in range(1, self.args.reporters + 1)])
+        await self.settle()
+
+
+class ResetStorm(Scenario):
+    # Все подписчики одновременно нажимают «загружено» на одном уведомлении
+    async def prepare(self):
+        from database import cooler_state
+        from utils import CallbackData
+
+        self.uid = await self.cooler()
+        self.admins = await self.subscribers(self.args.subscribers)
+        await self.feed([callback_update(1, CallbackData("no_all", self.uid).encode())])
+        await self.feed([message_update(1, photo=True)])
+        await self.settle()
+        self.incident = await cooler_state.get_incident_id(self.uid)
+        self.latencies, self.updates = [], 0
+
+    async def run(self):
+        from utils import CallbackData
+
+        actions = ("reset_water", "reset_glass", "reset_all", "take")
+        await self.feed([callback_update(i, CallbackData(actions[n % len(actions)], self.uid, self.incident).encode())
+                         for n, i in enumerate(self.admins)])
+        await self.settle()
+
+
+class CoolersQr(Scenario):
+    # Повторный /coolers qr должен уходить по file_id без загрузки
+    async def prepare(self):
+        from database import Database
+        from database.models import Cooler
+
+        await Database.coolers.collection.insert_many([Cooler(name=f"c{i}").dict() for i in range(self.args.coolers)])
+        self.admin = (await self.subscribers(1))[0]
+
+    async def run(self):
+        for _ in range(self.args.repeat):
+            await self.feed([message_update(self.admin, "/coolers qr")])
+
+
+SCENARIOS = {
+    "start_burst": StartBurst,
+    "report_flood": ReportFlood,
+    "reset_storm": ResetStorm,
+    "coolers_qr": CoolersQr,
+}
+
+
+async def run_scenario(name: str, app, api, args) -> dict:
+    scenario = SCENARIOS[name](app, api, args)
+    await scenario.reset()
+    await scenario.prepare()
+    api.calls.clear()
+    api.uploaded.clear()
+    db_ops.clear()
+
+    start = time.perf_counter()
+    await scenario.run()
+    elapsed = time.perf_counter() - start
+
+    updates = max(scenario.updates, 1)
+    calls = sum(api.calls.values())
+    ops = sum(db_ops.values())
+    return {
+        "updates": scenario.updates,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_ups": round(scenario.updates / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(scenario.latencies, 0.5), 2),
+            "p95": round(percentile(scenario.latencies, 0.95), 2),
+            "p99": round(percentile(scenario.latencies, 0.99), 2),
+            "mean": round(statistics.mean(scenario.latencies) * 1000, 2) if scenario.latencies else 0,
+        },
+        "db_ops_per_update": round(ops / updates, 2),
+        "telegram_calls_per_update": round(calls / updates, 2),
+        "uploaded_bytes": sum(api.uploaded.values()),
+        "db_ops": {f"{c}.{m}": v for (c, m), v in db_ops.most_common()},
+        "telegram_calls": dict(api.calls.most_common()),
+    }
+
+
+def revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", choices=list(SCENARIOS), action="append")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--subscribers", type=int, default=200)
+    parser.add_argument("--reporters", type=int, default=20)
+    parser.add_argument("--coolers", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--flood-rate", type=float, default=0.0)
+    parser.add_argument("--limits", action="store_true", help="оставить настоящие лимиты телеграма в Dispatcher")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    environ.setdefault("INCIDENT_WINDOW", "0.1")
+    count_db_ops()
+    app, api = await boot(latency=args.latency, flood_rate=args.flood_rate)
+    from database import ensure_indexes
+    await ensure_indexes()
+    api.retry_after = 0.01  # retry_after в секундах, в бенчмарке ждать целую секунду незачем
+    if not args.flood_rate:
+        app.outbox_worker.poll = 60  # Без повторов воркер будит enqueue, опрос outbox только засоряет счётчик запросов
+    if not args.limits:
+        # Меряем сам бот, а не ожидание в token bucket
+        app.dispatcher.global_bucket.rate = app.dispatcher.global_bucket.capacity = 10 ** 6
+        app.dispatcher.private_rate = app.dispatcher.group_rate = 10 ** 6
+        app.dispatcher.buckets.clear()
+
+    results = {
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+        "revision": revision(),
+        "python": platform.python_version(),
+        "parameters": vars(args),
+        "scenarios": {},
+    }
+    for name in args.scenario or list(SCENARIOS):
+        results["scenarios"][name] = result = await run_scenario(name, app, api, args)
+        print(f"{name:13} {result['updates']:5} upd {result['throughput_ups']:8.1f} upd/s  "
+              f"p50 {result['latency_ms']['p50']:7.1f}ms p99 {result['latency_ms']['p99']:7.1f}ms  "
+              f"db/upd {result['db_ops_per_update']:6.2f}  tg/upd {result['telegram_calls_per_update']:6.2f}")
+
+    await app.outbox_worker.stop()
+    await app.bot.close_session()
+    await api.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    else:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+"""
+Микробенчмарк TTLStore: запись, чтение, извлечение и очистка.
+По умолчанию хранилище в памяти, --state redis://... меряет RedisBackend (пакет redis из dev-packages).
+Запуск: python -m bench.ttl_store_bench --size 100000 [--state redis://localhost:6379/0]
+"""
+import argparse
+import asyncio
+import time
+
+from utils import TTLStore, MemoryBackend, make_backend
+
+
+async def measure(name, count, job):
+    start = time.perf_counter()
+    await job
+    elapsed = time.perf_counter() - start
+    print(f"{name:>8}: {elapsed / count * 1e9:8.0f} ns/op")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--state", help="адрес общего хранилища, как STATE_URL")
+    args = parser.parse_args()
+    keys = range(args.size)
+
+    backend = make_backend(args.state, prefix="bench:", max_size=None)
+    store = TTLStore(3600, backend)
+
+    async def fill():
+        for i in keys:
+            await store.set(i, ("cooler", "no_water"))
+
+    async def read():
+        for i in keys:
+            await store.get(i)
+
+    async def overwrite():
+        for i in reversed(keys):
+            await store.set(i, ("cooler", "no_glass"))
+
+    async def pop():
+        for i in keys:
+            await store.pop(i)
+
+    async def incr(target):
+        for i in keys:
+            await target.incr(f"quota:{i % 100}", 60)
+
+    await measure("set", args.size, fill())
+    await measure("get", args.size, read())
+    await measure("reset", args.size, overwrite())
+
+    if not isinstance(backend, MemoryBackend):
+        # Истечением в общем хранилище занимается сервер, меряем только счётчик ограничений
+        await measure("incr", args.size, incr(backend))
+        await measure("pop", args.size, pop())
+        return
+
+    # Очистка живого хранилища должна стоить O(1), а не O(n)
+    start = time.perf_counter()
+    for _ in range(1000):
+        await store.backend.sweep()
+    print(f"{'sweep':>8}: {(time.perf_counter() - start) / 1000 * 1e9:8.0f} ns/op with {len(store.backend)} live keys")
+
+    await measure("pop", args.size, pop())
+
+    expired = TTLStore(0.001, MemoryBackend())
+    for i in keys:
+        await expired.set(i, i)
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    removed = await expired.backend.sweep()
+    print(f"{'expire':>8}: {(time.perf_counter() - start) / removed * 1e9:8.0f} ns/op for {removed} expired keys")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
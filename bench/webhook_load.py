@@ -0,0 +1,78 @@
+"""
+Нагрузочный прогон webhook-режима: синтетические обновления отправляются на локальный сервер.
+Запуск: python -m bench.webhook_load --updates 2000 --users 200 --workers 8
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from aiohttp import ClientSession
+
+from bench.harness import boot, message_update, callback_update
+from utils import UpdateWorkerPool, WebhookServer
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)] * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--queue", type=int, default=1024)
+    parser.add_argument("--concurrency", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--port", type=int, default=8090)
+    args = parser.parse_args()
+
+    app, api = await boot(latency=args.latency)
+    from database import Database
+    from database.models import Cooler
+    cooler = str((await Database.coolers.save(Cooler(name="bench"), inject_default_id=True))._id)
+
+    pool = UpdateWorkerPool(app.bot, args.workers, args.queue)
+    server = WebhookServer(app.bot, pool, "127.0.0.1", args.port)
+    await server.start()
+
+    updates = []
+    for _ in range(args.updates):
+        uid = random.randint(1, args.users)
+        if random.random() < 0.5:
+            updates.append(message_update(uid, f"/start {cooler}"))
+        else:
+            updates.append(callback_update(uid, f"{cooler} no_water"))
+
+    accept = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+    async with ClientSession() as session:
+        async def post(update):
+            async with semaphore:
+                start = time.perf_counter()
+                async with session.post(f"http://127.0.0.1:{args.port}/webhook", json=update) as resp:
+                    await resp.read()
+                accept.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[post(i) for i in updates])
+        await pool.join()
+        elapsed = time.perf_counter() - start
+
+    handling = list(pool.latencies)
+    print(f"updates: {args.updates}, workers: {args.workers}, elapsed: {elapsed:.2f}s, "
+          f"throughput: {args.updates / elapsed:.0f} upd/s")
+    print(f"accept   p50 {percentile(accept, 0.5):.1f}ms p99 {percentile(accept, 0.99):.1f}ms")
+    print(f"handling p50 {percentile(handling, 0.5):.1f}ms p99 {percentile(handling, 0.99):.1f}ms "
+          f"mean {statistics.mean(handling) * 1000:.1f}ms")
+
+    await server.stop()
+    await app.bot.close_session()
+    await api.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
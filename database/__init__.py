@@ -1 +1,17 @@
-from .helper import Database, get_user_from_msg
+from .helper import Database, users_cache, chats_cache, coolers_cache
+from .projections import get_user, get_chat, get_cooler, UserRecord, ChatRecord, CoolerRecord
+from .breaker import breaker, CircuitBreaker, DatabaseUnavailable
+from .replay import ReplayQueue
+from . import cooler_state, notifications, incidents, outbox, leases, ticks, paging, projections
+from .indexes import ensure_indexes, check_query_plans
+from .event_sink import EventSink
+from .chat_sink import ChatSink
+from .recipients import RecipientRegistry
+
+
+def __getattr__(name):
+    # Аналитика нужна только для /stats, загружается при первом обращении
+    if name == "analytics":
+        from importlib import import_module
+        return import_module(".analytics", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+from database.helper import Database
+
+REPORT_TYPES = ["no_water", "no_glass", "no_all"]
+RESET_TYPES = ["reset_water", "reset_glass", "reset_all"]
+PERIOD_FORMATS = {"hour": "%Y-%m-%d %H:00", "day": "%Y-%m-%d"}
+
+
+def _since(days: int) -> datetime:
+    return datetime.utcnow() - timedelta(days=days)
+
+
+async def reports_per_cooler(period="day", days=7) -> list[dict]:
+    # Количество обращений по кулерам с группировкой по часам или дням
+    return await Database.events.collection.aggregate([
+        {"$match": {"type": {"$in": REPORT_TYPES}, "created_at": {"$gte": _since(days)}}},
+        {"$group": {
+            "_id": {
+                "cooler_id": "$cooler_id",
+                "period": {"$dateToString": {"format": PERIOD_FORMATS[period], "date": "$created_at"}},
+            },
+            "reports": {"$sum": 1},
+        }},
+        {"$sort": {"_id.period": 1, "reports": -1}},
+    ]).to_list(None)
+
+
+async def time_to_reset(days=7) -> list[dict]:
+    # Для каждого сброса ищется последнее обращение по тому же кулеру до него
+    return await Database.events.collection.aggregate([
+        {"$match": {"type": {"$in": RESET_TYPES}, "created_at": {"$gte": _since(days)}}},
+        {"$lookup": {
+            "from": Database.events.name,
+            "let": {"cooler_id": "$cooler_id", "reset_at": "$created_at"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$cooler_id", "$$cooler_id"]},
+                    {"$lt": ["$created_at", "$$reset_at"]},
+                    {"$in": ["$type", REPORT_TYPES]},
+                ]}}},
+                {"$sort": {"created_at": -1}},
+                {"$limit": 1},
+            ],
+            "as": "report",
+        }},
+        {"$unwind": "$report"},
+        {"$group": {
+            "_id": "$cooler_id",
+            "resets": {"$sum": 1},
+            "avg_seconds": {"$avg": {"$divide": [{"$subtract": ["$created_at", "$report.created_at"]}, 1000]}},
+            "max_seconds": {"$max": {"$divide": [{"$subtract": ["$created_at", "$report.created_at"]}, 1000]}},
+        }},
+        {"$sort": {"avg_seconds": -1}},
+    ]).to_list(None)
+
+
+async def top_reporters(limit=10, days=30) -> list[dict]:
+    return await Database.events.collection.aggregate([
+        {"$match": {"type": {"$in": REPORT_TYPES}, "created_at": {"$gte": _since(days)}}},
+        {"$group": {"_id": "$from_id", "reports": {"$sum": 1}}},
+        {"$sort": {"reports": -1}},
+        {"$limit": limit},
+    ]).to_list(None)
@@ -0,0 +1,62 @@
+import asyncio
+import time
+from os import environ
+
+from pymongo.errors import ConnectionFailure, ExecutionTimeout, PyMongoError
+
+
+class DatabaseUnavailable(PyMongoError):
+    """БД не ответила вовремя или автомат разомкнут."""
+
+
+class CircuitBreaker:
+    """
+    Автомат для запросов к БД с ограничением времени на операцию.
+    После failures подряд сетевых ошибок или таймаутов размыкается на reset_after секунд: запросы сразу
+    завершаются DatabaseUnavailable, не дожидаясь таймаута. Затем пропускает запросы на пробу,
+    первый успешный замыкает его снова. Ошибки, на которые БД ответила (например, DuplicateKeyError), успешны.
+    """
+
+    def __init__(self, failures=3, reset_after=10.0, timeout=2.0):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.timeout = timeout
+        self.errors = 0
+        self.opened_at = None
+        self.rejected = 0
+
+    @property
+    def open(self) -> bool:
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.reset_after
+
+    def success(self):
+        self.errors = 0
+        self.opened_at = None
+
+    def failure(self):
+        self.errors += 1
+        if self.errors >= self.failures or self.opened_at is not None:
+            self.opened_at = time.monotonic()  # Проба после размыкания тоже не прошла
+
+    async def call(self, awaitable, timeout: float = None):
+        if self.open:
+            self.rejected += 1
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise DatabaseUnavailable("Circuit breaker is open")
+        try:
+            result = await asyncio.wait_for(awaitable, timeout or self.timeout)
+        except DatabaseUnavailable:
+            raise
+        except (ConnectionFailure, ExecutionTimeout, asyncio.TimeoutError) as e:
+            self.failure()
+            raise DatabaseUnavailable(str(e) or type(e).__name__) from e
+        except Exception:
+            self.success()
+            raise
+        self.success()
+        return result
+
+
+breaker = CircuitBreaker(int(environ.get("DB_FAILURES", 3)), float(environ.get("DB_RESET_AFTER", 10)),
+                         float(environ.get("DB_TIMEOUT", 2)))
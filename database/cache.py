@@ -0,0 +1,51 @@
+import time
+from collections import OrderedDict
+
+MISSING = object()  # Маркер отсутствия ключа в кэше, None — закэшированное отсутствие документа
+
+
+class TTLCache:
+    """
+    Кэш документов с ограничением времени жизни и размера (вытесняется давно не использованное).
+    Отрицательные результаты хранятся как None.
+    Просроченные значения остаются до вытеснения: get_stale отдаёт их, пока БД недоступна.
+    """
+
+    def __init__(self, ttl=60, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=MISSING):
+        item = self.data.get(key)
+        if item is None or item[1] < time.monotonic():
+            self.misses += 1
+            return default
+        self.data.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def get_stale(self, key, default=MISSING):
+        item = self.data.get(key)
+        return default if item is None else item[0]
+
+    def set(self, key, value):
+        self.data[key] = (value, time.monotonic() + self.ttl)
+        self.data.move_to_end(key)
+        if len(self.data) > self.max_size:
+            self.data.popitem(last=False)
+
+    def invalidate(self, key):
+        self.data.pop(key, None)
+
+    def clear(self):
+        self.data.clear()
+
+    def expire(self):
+        # Все значения считаются устаревшими, но остаются для get_stale
+        self.data = OrderedDict((k, (v, 0)) for k, (v, _) in self.data.items())
+
+    def stats(self) -> dict:
+        return {"size": len(self.data), "hits": self.hits, "misses": self.misses}
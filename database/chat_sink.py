@@ -0,0 +1,54 @@
+import asyncio
+
+from pymongo import UpdateOne
+
+from database.helper import Database
+from database.periodic import Periodic
+
+
+class ChatSink:
+    """
+    Регистрирует групповые чаты, в которых бот видит сообщения, одним bulk_write по размеру или по времени.
+    Уже записанные чаты запоминаются и повторно не пишутся.
+    """
+
+    def __init__(self, max_size=100, interval=5.0, max_seen=100000):
+        self.max_size = max_size
+        self.max_seen = max_seen
+        self.buffer: set[int] = set()
+        self.seen: set[int] = set()
+        self.flusher = Periodic(self.flush, interval)
+        self.flushing = None
+
+    def add(self, chat_id: int):
+        if chat_id in self.seen:
+            return
+        self.buffer.add(chat_id)
+        if len(self.buffer) >= self.max_size and (self.flushing is None or self.flushing.done()):
+            self.flushing = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        batch, self.buffer = self.buffer, set()
+        if not batch:
+            return
+        try:
+            await Database.chats.collection.bulk_write([
+                UpdateOne({"chat_id": i}, {"$setOnInsert": {"chat_id": i, "send_notif": False}}, upsert=True)
+                for i in batch
+            ], ordered=False)
+        except Exception as e:
+            print(e)
+            self.buffer |= batch  # Повторим при следующей записи
+            return
+        if len(self.seen) + len(batch) > self.max_seen:
+            self.seen.clear()
+        self.seen |= batch
+
+    def start(self):
+        self.flusher.start()
+
+    async def stop(self):
+        await self.flusher.stop()
+        if self.flushing is not None:
+            await asyncio.gather(self.flushing, return_exceptions=True)
+        await self.flush()
@@ -0,0 +1,125 @@
+from datetime import datetime
+
+# noinspection PyPackageRequirements
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymotyc.errors import NotFound
+
+from database.helper import Database
+from database.models import Cooler
+
+# Какие флаги кулера выставляет обращение и сбрасывает кнопка
+REPORT_FLAGS = {
+    "no_water": ("empty_watter",),
+    "no_glass": ("empty_glass",),
+    "no_all": ("empty_watter", "empty_glass"),
+}
+RESET_FLAGS = {
+    "reset_water": ("empty_watter",),
+    "reset_glass": ("empty_glass",),
+    "reset_all": ("empty_watter", "empty_glass"),
+}
+
+
+async def _ensure_exists(query: dict):
+    if not await Database.coolers.collection.count_documents(query, limit=1):
+        raise NotFound(query)
+
+
+async def mark_empty(uid: str, status: str) -> Cooler | None:
+    """
+    Атомарно выставляет флаги отсутствия.
+    Возвращает кулер с флагами в состоянии до изменения и текущим incident_id
+    или None, если обращение уже зарегистрировано.
+    Если кулер был полностью заполнен, открывается новый случай.
+    """
+    flags = REPORT_FLAGS[status]
+    query = {"_id": ObjectId(uid)}
+    incident_id = str(ObjectId())
+    document = await Database.coolers.collection.find_one_and_update(
+        {**query, "empty_watter": {"$ne": True}, "empty_glass": {"$ne": True}},
+        {"$set": {**{i: True for i in flags}, "incident_id": incident_id, "empty_since": datetime.utcnow(),
+                  "escalated": False}},
+        return_document=ReturnDocument.BEFORE
+    )
+    if document is not None:
+        document["incident_id"] = incident_id
+    else:
+        # Кулер уже пустой, дополняем текущий случай
+        document = await Database.coolers.collection.find_one_and_update(
+            {**query, "$or": [{i: {"$ne": True}} for i in flags]},
+            {"$set": {i: True for i in flags}},
+            return_document=ReturnDocument.BEFORE
+        )
+    if document is None:
+        await _ensure_exists(query)
+        return None
+    return Database.coolers.parse_document(document, inject_default_id=True)
+
+
+async def get_incident_id(uid: str) -> str | None:
+    document = await Database.coolers.collection.find_one({"_id": ObjectId(uid)}, {"incident_id": 1})
+    if document is None:
+        raise NotFound({"_id": uid})
+    return document.get("incident_id")
+
+
+async def reset(uid: str, status: str, incident_id: str = None) -> Cooler:
+    """
+    Возвращает кулер после сброса флагов, incident_id в нём — закрываемого случая.
+    С incident_id сбрасывает только если случай ещё открыт и сбрасываемый флаг ещё стоит,
+    иначе NotFound — кнопка устарела.
+    Полный сброс закрывает случай: incident_id у кулера очищается.
+    """
+    flags = RESET_FLAGS[status]
+    query = {"_id": ObjectId(uid)}
+    if incident_id is not None:
+        query["incident_id"] = incident_id
+        query["$or"] = [{i: True} for i in flags]
+    cooler = await Database.coolers.update_one(
+        query, update={"$set": {i: False for i in flags}}, inject_default_id=True
+    )
+    if not cooler.empty_watter and not cooler.empty_glass:
+        # Кулер заполнен, если за это время не открылся новый случай
+        await Database.coolers.collection.update_one(
+            {"_id": query["_id"], "empty_watter": False, "empty_glass": False},
+            {"$set": {"empty_since": None, "incident_id": None}}
+        )
+        cooler.empty_since = None
+    return cooler
+
+
+async def overdue(before: datetime, escalated: bool | None = None) -> list[Cooler]:
+    """
+    Кулеры, пустые с момента before и раньше, начиная с самых давних.
+    escalated=False — только ещё не переданные, None — все.
+    """
+    # Без фильтра перечисляем оба значения, чтобы запрос шёл по индексу escalated_empty_since
+    query = {"escalated": {"$in": [False, True]} if escalated is None else escalated, "empty_since": {"$lte": before}}
+    documents = await Database.coolers.collection.find(query).sort("empty_since").to_list(None)
+    return [Database.coolers.parse_document(i, inject_default_id=True) for i in documents]
+
+
+async def mark_escalated(incident_ids: list[str]):
+    await Database.coolers.collection.update_many({"incident_id": {"$in": incident_ids}}, {"$set": {"escalated": True}})
+
+
+async def status() -> tuple[int, list[Cooler]]:
+    # Количество кулеров и пустые кулеры, начиная с самых давних, одной агрегацией
+    result = await Database.coolers.collection.aggregate([{"$facet": {
+        "total": [{"$count": "count"}],
+        "empty": [
+            {"$match": {"$or": [{"empty_watter": True}, {"empty_glass": True}]}},
+            {"$sort": {"empty_since": 1}},
+        ],
+    }}]).to_list(None)
+    total = result[0]["total"][0]["count"] if result[0]["total"] else 0
+    return total, [Database.coolers.parse_document(i, inject_default_id=True) for i in result[0]["empty"]]
+
+
+async def migrate_empty_since():
+    # Кулеры, опустевшие до появления empty_since, считаются пустыми с момента миграции и ещё не переданными
+    await Database.coolers.collection.update_many(
+        {"$or": [{"empty_watter": True}, {"empty_glass": True}], "empty_since": None},
+        {"$set": {"empty_since": datetime.utcnow(), "escalated": False}}
+    )
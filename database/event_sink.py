@@ -0,0 +1,44 @@
+import asyncio
+
+from database.breaker import breaker
+from database.helper import Database
+from database.periodic import Periodic
+from database.models import Event
+
+
+class EventSink:
+    """
+    Буфер событий, который пишет их в БД одним insert_many по размеру или по времени.
+    """
+
+    def __init__(self, max_size=100, interval=5.0, max_buffer=10000):
+        self.max_size = max_size
+        self.max_buffer = max_buffer
+        self.buffer: list[Event] = []
+        self.flusher = Periodic(self.flush, interval)
+        self.flushing = None
+
+    def add(self, event: Event):
+        self.buffer.append(event)
+        if len(self.buffer) >= self.max_size and (self.flushing is None or self.flushing.done()):
+            self.flushing = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        batch, self.buffer = self.buffer, []
+        if not batch:
+            return
+        try:
+            await breaker.call(Database.events.collection.insert_many([i.dict() for i in batch], ordered=False))
+        except Exception as e:
+            print(e)
+            # Возвращаем события в буфер, но не даём ему расти бесконечно, пока БД недоступна
+            self.buffer = (batch + self.buffer)[-self.max_buffer:]
+
+    def start(self):
+        self.flusher.start()
+
+    async def stop(self):
+        await self.flusher.stop()
+        if self.flushing is not None:
+            await asyncio.gather(self.flushing, return_exceptions=True)
+        await self.flush()
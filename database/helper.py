@@ -1,19 +1,95 @@
 from os import environ
 
+from pymongo import IndexModel, ASCENDING
 from pymotyc import Collection
 
+from database.cache import TTLCache
 from database.models import *
 
 
+def _notif_index():
+    # В выборку подписчиков попадает малая часть документов, индексируем только их
+    return IndexModel([("send_notif", ASCENDING)], name="send_notif_true",
+                      partialFilterExpression={"send_notif": True})
+
+
+def _events_index():
+    # При EVENTS_TTL старые события удаляет сама Mongo
+    if environ.get("EVENTS_TTL"):
+        return IndexModel([("created_at", ASCENDING)], name="created_at_ttl",
+                          expireAfterSeconds=int(environ["EVENTS_TTL"]))
+    return IndexModel([("created_at", ASCENDING)], name="created_at")
+
+
 class Database:
     __db__name__ = environ.get("DB_NAME", "stakan_test")
-    coolers: Collection[Cooler]
-    users: Collection[User]
-    events: Collection[Event]
-    chats: Collection[Chat]
+    coolers: Collection[Cooler] = Collection(indexes=[
+        # Планировщик выбирает давно пустые и ещё не переданные кулеры одним запросом
+        IndexModel([("escalated", ASCENDING), ("empty_since", ASCENDING)], name="escalated_empty_since"),
+        # Постраничные списки пустых кулеров
+        IndexModel([("empty_watter", ASCENDING), ("_id", ASCENDING)], name="empty_watter_id"),
+        IndexModel([("empty_glass", ASCENDING), ("_id", ASCENDING)], name="empty_glass_id"),
+    ])
+    users: Collection[User] = Collection(indexes=[
+        IndexModel([("telegram_id", ASCENDING)], unique=True, name="telegram_id_unique"),
+        _notif_index(),
+        IndexModel([("banned_until", ASCENDING)], name="banned_until", partialFilterExpression={"banned": True}),
+        # Постраничные списки черного списка и админов
+        IndexModel([("banned", ASCENDING), ("_id", ASCENDING)], name="banned_id"),
+        IndexModel([("admin", ASCENDING), ("_id", ASCENDING)], name="admin_id"),
+    ])
+    events: Collection[Event] = Collection(indexes=[
+        _events_index(),
+        IndexModel([("cooler_id", ASCENDING), ("created_at", ASCENDING)], name="cooler_created_at"),
+    ])
+    chats: Collection[Chat] = Collection(indexes=[
+        IndexModel([("chat_id", ASCENDING)], unique=True, name="chat_id_unique"),
+        _notif_index(),
+    ])
+    notifications: Collection[Notification] = Collection(indexes=[
+        IndexModel([("cooler_id", ASCENDING), ("incident_id", ASCENDING), ("state", ASCENDING)],
+                   name="cooler_incident_state"),
+        IndexModel([("chat_id", ASCENDING), ("message_id", ASCENDING)], unique=True, name="chat_message_unique"),
+    ])
+    qr_codes: Collection[QrCode] = Collection(indexes=[
+        IndexModel([("cooler_id", ASCENDING), ("style", ASCENDING)], unique=True, name="cooler_style_unique"),
+    ])
+    incidents: Collection[Incident] = Collection(indexes=[
+        IndexModel([("incident_id", ASCENDING)], unique=True, name="incident_id_unique"),
+        IndexModel([("cooler_id", ASCENDING), ("opened_at", ASCENDING)], name="cooler_opened_at"),
+    ])
+    media: Collection[MediaFile] = Collection(indexes=[
+        IndexModel([("key", ASCENDING), ("style", ASCENDING)], unique=True, name="key_style_unique"),
+    ])
+    leases: Collection[Lease] = Collection(indexes=[
+        IndexModel([("name", ASCENDING)], unique=True, name="name_unique"),
+    ])
+    # Состояние диалогов при нескольких репликах, просроченное удаляет сама Mongo
+    state: Collection[StateEntry] = Collection(indexes=[
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ])
+    ticks: Collection[Tick] = Collection(indexes=[
+        IndexModel([("name", ASCENDING)], unique=True, name="name_unique"),
+    ])
+    outbox: Collection[OutboxItem] = Collection(indexes=[
+        IndexModel([("key", ASCENDING)], unique=True, name="key_unique"),
+        IndexModel([("state", ASCENDING), ("next_at", ASCENDING)], name="state_next_at"),
+        IndexModel([("context.incident_id", ASCENDING), ("method", ASCENDING)], name="incident_method"),
+        # Выполненные операции хранятся для идемпотентности OUTBOX_TTL секунд
+        IndexModel([("done_at", ASCENDING)], name="done_at_ttl",
+                   expireAfterSeconds=int(environ.get("OUTBOX_TTL", 7 * 24 * 3600))),
+    ])
+
+
+CACHE_TTL = int(environ.get("CACHE_TTL", 60))
+# Запись на одной реплике не сбросит кэш другой: при нескольких репликах кэши включает RecipientRegistry,
+# пока change stream доносит записи всех реплик, а до того они хранят значения только для get_stale
+SHARED_CACHES = int(environ.get("SHARD_COUNT", 1)) > 1
+
+# Кэши документов по telegram_id и chat_id, сбрасываются при каждой записи
+users_cache = TTLCache(0 if SHARED_CACHES else CACHE_TTL, int(environ.get("CACHE_SIZE", 10000)))
+chats_cache = TTLCache(0 if SHARED_CACHES else CACHE_TTL, int(environ.get("CACHE_SIZE", 10000)))
 
 
-def get_user_from_msg(message):
-    return Database.users.find_one({
-        "telegram_id": message.from_user.id
-    }, inject_default_id=True)
+# Последнее прочитанное состояние кулеров, отдаётся только пока БД недоступна
+coolers_cache = TTLCache(0, int(environ.get("CACHE_SIZE", 10000)))
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database.helper import Database
+from database.models import Incident
+
+MAX_PHOTOS = 10
+
+
+async def attach(incident_id: str, cooler_id: str, reporter: int, author: str, photo: str) -> Incident:
+    # Добавляет обращение к случаю, первое обращение создаёт его
+    document = await Database.incidents.collection.find_one_and_update(
+        {"incident_id": incident_id},
+        {
+            "$setOnInsert": {"cooler_id": cooler_id, "author": author, "opened_at": datetime.utcnow()},
+            "$addToSet": {"reporters": reporter},
+            "$push": {"photos": {"$each": [photo], "$slice": -MAX_PHOTOS}},
+            "$inc": {"reports": 1, "version": 1},
+        },
+        upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return Database.incidents.parse_document(document, inject_default_id=True)
+
+
+async def get(incident_id: str | None) -> Incident | None:
+    # Для уведомлений, отправленных до появления случаев, документа нет
+    documents = await Database.incidents.find({"incident_id": incident_id}, inject_default_id=True, limit=1)
+    return documents[0] if documents else None
+
+
+async def take(incident_id: str, cooler_id: str, username: str) -> Incident | None:
+    """
+    Отмечает, кто взялся за случай. None, если уже взялись или случай закрыт.
+    Для уведомлений, отправленных до появления случаев, документ создаётся.
+    """
+    try:
+        document = await Database.incidents.collection.find_one_and_update(
+            {"incident_id": incident_id, "taken_by": None, "closed_at": None},
+            {"$set": {"taken_by": username}, "$setOnInsert": {"cooler_id": cooler_id}, "$inc": {"version": 1}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        return None  # Документ есть, но условие не выполнено
+    return Database.incidents.parse_document(document, inject_default_id=True)
+
+
+async def close(incident_id: str):
+    await Database.incidents.collection.update_one(
+        {"incident_id": incident_id}, {"$set": {"closed_at": datetime.utcnow()}, "$inc": {"version": 1}}
+    )
@@ -0,0 +1,74 @@
+"""
+Создание индексов и проверка планов горячих запросов.
+Проверка: python -m database.indexes (код выхода 1, если какой-то запрос идёт через COLLSCAN).
+"""
+import asyncio
+import sys
+from os import environ
+
+from pymongo.errors import OperationFailure
+
+from database.helper import Database
+
+# Запросы, которые выполняются на каждое обновление или обращение
+HOT_QUERIES = [
+    ("users", {"telegram_id": 0}),
+    ("users", {"send_notif": True}),
+    ("chats", {"chat_id": 0}),
+    ("chats", {"send_notif": True}),
+    ("qr_codes", {"cooler_id": "", "style": ""}),
+    ("notifications", {"cooler_id": "", "incident_id": "", "state": "active"}),
+    ("incidents", {"incident_id": ""}),
+    ("media", {"key": "", "style": ""}),
+    ("coolers", {"escalated": False, "empty_since": {"$lte": 0}}),
+    ("coolers", {"escalated": {"$in": [False, True]}, "empty_since": {"$lte": 0}}),
+    ("outbox", {"state": {"$in": ["pending", "running"]}, "next_at": {"$lte": 0}}),
+]
+
+
+async def ensure_indexes():
+    for name in ("coolers", "users", "events", "chats", "notifications", "qr_codes", "incidents", "outbox", "media",
+                 "leases", "ticks", "state"):
+        try:
+            await getattr(Database, name).create_indexes()
+        except OperationFailure as e:
+            # Например, дубликаты мешают уникальному индексу — бот при этом должен запуститься
+            print(f"Failed to create indexes for {name}: {e}")
+
+
+def _stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for i in plan.get("inputStages", []):
+        yield from _stages(i)
+
+
+async def check_query_plans() -> list[str]:
+    # Возвращает список запросов, которые выполняются полным просмотром коллекции
+    failed = []
+    for name, query in HOT_QUERIES:
+        plan = await getattr(Database, name).collection.find(query).explain()
+        stages = list(_stages(plan["queryPlanner"]["winningPlan"]))
+        print(f"{name} {query}: {' <- '.join(filter(None, stages))}")
+        if "COLLSCAN" in stages:
+            failed.append(f"{name} {query}")
+    return failed
+
+
+async def main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymotyc import Engine
+
+    await Engine().bind(motor=AsyncIOMotorClient(environ.get("DATABASE_URL", "")), databases=[Database],
+                        inject_motyc_fields=True)
+    await ensure_indexes()
+    failed = await check_query_plans()
+    if failed:
+        print("COLLSCAN in: " + ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
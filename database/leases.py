@@ -0,0 +1,32 @@
+"""
+Аренды в Mongo для выбора ведущей реплики: держатель продлевает аренду,
+после её окончания захватить её может любая другая реплика.
+"""
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+from database.helper import Database
+
+
+async def acquire(name: str, owner: str, ttl: float) -> bool:
+    # Захватывает свободную или продлевает свою аренду
+    now = datetime.utcnow()
+    try:
+        await Database.leases.collection.update_one(
+            {"name": name, "$or": [{"owner": owner}, {"expires_at": {"$lte": now}}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=ttl)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False  # Аренда занята другой репликой
+    return True
+
+
+async def release(name: str, owner: str):
+    await Database.leases.collection.delete_one({"name": name, "owner": owner})
+
+
+async def holder(name: str) -> str | None:
+    document = await Database.leases.collection.find_one({"name": name, "expires_at": {"$gt": datetime.utcnow()}})
+    return None if document is None else document["owner"]
@@ -2,3 +2,11 @@ from .cooler import Cooler
 from .user import User
 from .event import Event
 from .chat import Chat
+from .qr_code import QrCode
+from .notification import Notification
+from .incident import Incident
+from .outbox_item import OutboxItem
+from .media_file import MediaFile
+from .lease import Lease
+from .state_entry import StateEntry
+from .tick import Tick
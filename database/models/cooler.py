@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel
 
 
@@ -5,4 +7,6 @@ class Cooler(BaseModel):
     name: str
     empty_watter: bool = False
     empty_glass: bool = False
-    sent_messages: list[list] = []
+    incident_id: str | None = None  # Текущий случай отсутствия, к нему привязаны уведомления
+    empty_since: datetime | None = None  # Начало случая, пока кулер не заполнен полностью
+    escalated: bool = False  # Случай уже передан пользователям с can_add_admin
@@ -1,10 +1,11 @@
 from datetime import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class Event(BaseModel):
     type: str
     from_id: int
     description: str
-    created_at: datetime = datetime.now()
+    cooler_id: str | None = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)  # Время создания события, а не импорта модуля
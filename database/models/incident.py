@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+
+
+class Incident(BaseModel):
+    incident_id: str
+    cooler_id: str
+    author: str = ""  # Кто сообщил первым, для подписи уведомления
+    reporters: list[int] = []
+    photos: list[str] = []  # file_id последних фотографий
+    reports: int = 0
+    taken_by: str | None = None
+    version: int = 0  # Растёт при каждом изменении случая
+    opened_at: datetime = Field(default_factory=datetime.utcnow)
+    closed_at: datetime | None = None
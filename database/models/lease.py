@@ -0,0 +1,9 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class Lease(BaseModel):
+    name: str
+    owner: str
+    expires_at: datetime
@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+
+class MediaFile(BaseModel):
+    key: str  # id кулера или sheet:<хэш списка кулеров>
+    style: str  # Хэш оформления, при его смене файл загружается заново
+    file_id: str
@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+
+class Notification(BaseModel):
+    cooler_id: str
+    chat_id: int
+    message_id: int
+    incident_id: str | None = None
+    state: str = "active"
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+
+
+class OutboxItem(BaseModel):
+    key: str  # Ключ идемпотентности, одна операция на ключ
+    method: str
+    chat_id: int
+    args: list = []
+    kwargs: dict = {}
+    context: dict = {}  # cooler_id, incident_id и т.п. для обработки результата
+    replace: bool = False  # Повторная постановка заменяет аргументы и запускает операцию снова
+    state: str = "pending"  # pending, running, done, failed
+    attempts: int = 0
+    revision: int = 0  # Растёт при каждой замене аргументов
+    next_at: datetime = Field(default_factory=datetime.utcnow)  # Когда выполнять, для running — конец аренды
+    claim: str | None = None
+    error: str | None = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    done_at: datetime | None = None
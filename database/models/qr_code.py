@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+
+class QrCode(BaseModel):
+    cooler_id: str
+    style: str
+    png: bytes
@@ -0,0 +1,10 @@
+from datetime import datetime
+from typing import Any
+
+from pydantic import BaseModel
+
+
+class StateEntry(BaseModel):
+    # _id — ключ состояния с префиксом хранилища
+    value: Any = None
+    expires_at: datetime
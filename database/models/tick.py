@@ -0,0 +1,9 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class Tick(BaseModel):
+    name: str
+    slot: int  # Номер последнего выполненного периода
+    at: datetime
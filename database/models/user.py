@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel
 
 
@@ -6,5 +8,6 @@ class User(BaseModel):
     name: str
     send_notif: bool = False
     banned: bool = False
+    banned_until: datetime | None = None  # Временный бан за превышение квот, снимается планировщиком
     admin: bool = False
     can_add_admin: bool = False
@@ -0,0 +1,65 @@
+from pymongo import DeleteOne, InsertOne
+from pymongo.errors import BulkWriteError
+
+from database.helper import Database
+from database.models import Notification
+
+
+async def add(cooler_id: str, incident_id: str | None, messages: list[tuple[int, int]]):
+    if messages:
+        await Database.notifications.collection.bulk_write([
+            InsertOne(Notification(cooler_id=cooler_id, chat_id=chat_id, message_id=message_id,
+                                   incident_id=incident_id).dict())
+            for chat_id, message_id in messages
+        ], ordered=False)
+
+
+async def exists(cooler_id: str, incident_id: str | None) -> bool:
+    document = await Database.notifications.collection.find_one(
+        {"cooler_id": cooler_id, "incident_id": incident_id, "state": "active"}, {"_id": 1}
+    )
+    return document is not None
+
+
+async def batches(cooler_id: str, incident_id: str | None, size=100):
+    """
+    Уведомления случая пачками по size пар (chat_id, message_id), читаются курсором,
+    поэтому список целиком в память не загружается.
+    """
+    cursor = Database.notifications.collection.find(
+        {"cooler_id": cooler_id, "incident_id": incident_id, "state": "active"},
+        {"_id": 0, "chat_id": 1, "message_id": 1},
+        batch_size=size
+    )
+    batch = []
+    async for i in cursor:
+        batch.append((i["chat_id"], i["message_id"]))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def remove(messages: list[tuple[int, int]]):
+    if messages:
+        await Database.notifications.collection.bulk_write([
+            DeleteOne({"chat_id": chat_id, "message_id": message_id}) for chat_id, message_id in messages
+        ], ordered=False)
+
+
+async def close(cooler_id: str, incident_id: str | None):
+    await Database.notifications.collection.delete_many({"cooler_id": cooler_id, "incident_id": incident_id})
+
+
+async def migrate_sent_messages():
+    # Переносит sent_messages, которые раньше хранились в документе кулера
+    async for cooler in Database.coolers.collection.find({"sent_messages": {"$exists": True}}):
+        incident_id = cooler.get("incident_id") or str(cooler["_id"])
+        try:
+            await add(str(cooler["_id"]), incident_id, [tuple(i) for i in cooler["sent_messages"]])
+        except BulkWriteError:
+            pass  # Часть уже перенесена при прошлом запуске
+        await Database.coolers.collection.update_one(
+            {"_id": cooler["_id"]}, {"$set": {"incident_id": incident_id}, "$unset": {"sent_messages": ""}}
+        )
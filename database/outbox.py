@@ -0,0 +1,111 @@
+"""
+Хранилище исходящих операций телеграма (outbox).
+Операция записывается до выполнения и выполняется воркером из utils.outbox,
+поэтому рассылка продолжается после перезапуска процесса.
+"""
+from datetime import datetime, timedelta
+
+# noinspection PyPackageRequirements
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from database.helper import Database
+from database.models import OutboxItem
+
+ACTIVE = {"state": {"$in": ["pending", "running"]}}
+
+
+async def enqueue(items: list[OutboxItem]):
+    """
+    Ставит операции в очередь одним bulk_write.
+    Без replace повторная постановка с тем же ключом ничего не делает,
+    с replace — заменяет аргументы и снова ставит операцию в очередь.
+    """
+    if not items:
+        return
+    requests = []
+    for i in items:
+        document = i.dict(exclude={"key", "revision"})
+        if i.replace:
+            document.update(state="pending", attempts=0, next_at=datetime.utcnow(), error=None, done_at=None)
+            requests.append(UpdateOne({"key": i.key}, {"$set": document, "$inc": {"revision": 1}}, upsert=True))
+        else:
+            requests.append(UpdateOne({"key": i.key}, {"$setOnInsert": {**document, "revision": 0}}, upsert=True))
+    await Database.outbox.collection.bulk_write(requests, ordered=False)
+
+
+async def claim(limit: int, lease: float) -> list[dict]:
+    # Забирает готовые операции, в том числе брошенные упавшим процессом после окончания аренды
+    now = datetime.utcnow()
+    query = {**ACTIVE, "next_at": {"$lte": now}}
+    ids = [i["_id"] async for i in
+           Database.outbox.collection.find(query, {"_id": 1}).sort("next_at", 1).limit(limit)]
+    if not ids:
+        return []
+    token = str(ObjectId())
+    await Database.outbox.collection.update_many(
+        {**query, "_id": {"$in": ids}},
+        {"$set": {"state": "running", "claim": token, "next_at": now + timedelta(seconds=lease)}}
+    )
+    return await Database.outbox.collection.find({"_id": {"$in": ids}, "claim": token}).to_list(None)
+
+
+async def complete(item: dict) -> bool:
+    """
+    Отмечает операцию выполненной.
+    False, если во время выполнения операцию поставили заново или поменяли её аргументы.
+    """
+    document = await Database.outbox.collection.find_one_and_update(
+        {"_id": item["_id"], "claim": item["claim"]},
+        {"$set": {"state": "done", "done_at": datetime.utcnow(), "claim": None, "error": None}},
+        {"revision": 1}
+    )
+    return document is not None and document["revision"] == item["revision"]
+
+
+async def get(item_id) -> dict | None:
+    return await Database.outbox.collection.find_one({"_id": item_id})
+
+
+async def retry(item: dict, delay: float, error: str):
+    await Database.outbox.collection.update_one(
+        {"_id": item["_id"], "claim": item["claim"]},
+        {"$set": {"state": "pending", "next_at": datetime.utcnow() + timedelta(seconds=delay), "claim": None,
+                  "error": error}, "$inc": {"attempts": 1}}
+    )
+
+
+async def fail(item: dict, error: str):
+    await Database.outbox.collection.update_one(
+        {"_id": item["_id"], "claim": item["claim"]},
+        {"$set": {"state": "failed", "done_at": datetime.utcnow(), "claim": None, "error": error},
+         "$inc": {"attempts": 1}}
+    )
+
+
+async def update_pending(query: dict, values: dict) -> int:
+    # Меняет аргументы ещё не выполненных операций, например подпись неотправленных уведомлений
+    result = await Database.outbox.collection.update_many(
+        {**query, **ACTIVE}, {"$set": values, "$inc": {"revision": 1}}
+    )
+    return result.modified_count
+
+
+async def cancel(query: dict):
+    # Ожидающие операции удаляются, выполняющимся ставится context.cancelled — их результат нужно отменить
+    await Database.outbox.collection.delete_many({**query, "state": "pending"})
+    await Database.outbox.collection.update_many(
+        {**query, "state": "running"}, {"$set": {"context.cancelled": True}, "$inc": {"revision": 1}}
+    )
+
+
+async def broadcast_started(incident_id: str) -> bool:
+    # Ставилась ли рассылка по случаю, по индексу incident_method
+    document = await Database.outbox.collection.find_one(
+        {"context.incident_id": incident_id, "method": "send_photo"}, {"_id": 1}
+    )
+    return document is not None
+
+
+async def pending() -> int:
+    return await Database.outbox.collection.count_documents(ACTIVE)
@@ -0,0 +1,28 @@
+"""
+Постраничное чтение по диапазонам _id: страница стоит O(размера страницы) при любом её номере,
+в отличие от skip/limit, и не съезжает при добавлении документов.
+"""
+from dataclasses import dataclass
+
+# noinspection PyPackageRequirements
+from bson import ObjectId
+
+
+@dataclass
+class Page:
+    items: list[dict]
+    has_prev: bool
+    has_next: bool
+
+
+async def page(collection, query: dict, projection: dict, size: int, after: str = None, before: str = None) -> Page:
+    # Страница после документа after или перед документом before, без них — первая
+    raw = collection.collection
+    if before is not None:
+        documents = await raw.find({**query, "_id": {"$lt": ObjectId(before)}}, projection) \
+            .sort("_id", -1).limit(size + 1).to_list(None)
+        return Page(documents[:size][::-1], len(documents) > size, True)
+    if after is not None:
+        query = {**query, "_id": {"$gt": ObjectId(after)}}
+    documents = await raw.find(query, projection).sort("_id", 1).limit(size + 1).to_list(None)
+    return Page(documents[:size], after is not None, len(documents) > size)
@@ -0,0 +1,35 @@
+import asyncio
+
+
+class Periodic:
+    """
+    Фоновая задача: вызывает корутину function() каждые interval секунд, с immediately — сразу после запуска.
+    Ошибка одного вызова печатается и не останавливает цикл.
+    """
+
+    def __init__(self, function, interval: float, immediately=False):
+        self.function = function
+        self.interval = interval
+        self.immediately = immediately
+        self.task = None
+
+    async def run(self):
+        if not self.immediately:
+            await asyncio.sleep(self.interval)
+        while True:
+            try:
+                await self.function()
+            except Exception as e:
+                print(e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+        return self.task
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
@@ -0,0 +1,110 @@
+"""
+Быстрое чтение для горячих путей: только нужные поля, без pydantic-моделей и валидации.
+Документы превращаются в неизменяемые записи со __slots__ (NamedTuple), отсутствующие поля — в значения по умолчанию.
+Модели pymotyc остаются для записи и редких чтений целых документов.
+"""
+from datetime import datetime
+from typing import NamedTuple
+
+# noinspection PyPackageRequirements
+from bson import ObjectId
+from pymotyc.errors import NotFound
+
+from database.breaker import breaker, DatabaseUnavailable
+from database.cache import TTLCache, MISSING
+from database.helper import Database, users_cache, chats_cache, coolers_cache
+
+
+class UserRecord(NamedTuple):
+    telegram_id: int
+    name: str = ""
+    send_notif: bool = False
+    banned: bool = False
+    banned_until: datetime | None = None
+    admin: bool = False
+    can_add_admin: bool = False
+
+
+class ChatRecord(NamedTuple):
+    chat_id: int
+    send_notif: bool = False
+
+
+class CoolerRecord(NamedTuple):
+    id: ObjectId  # _id документа
+    name: str = ""
+    empty_watter: bool = False
+    empty_glass: bool = False
+    incident_id: str | None = None
+
+
+_plans: dict[type, tuple[dict, tuple, tuple]] = {}
+
+
+def _plan(record: type) -> tuple[dict, tuple, tuple]:
+    # Проекция, имена полей документа и значения по умолчанию, считаются один раз на тип записи
+    plan = _plans.get(record)
+    if plan is None:
+        keys = tuple("_id" if i == "id" else i for i in record._fields)
+        projection = {i: 1 for i in keys}
+        projection.setdefault("_id", 0)
+        defaults = tuple(record._field_defaults.get(i) for i in record._fields)
+        plan = _plans[record] = (projection, keys, defaults)
+    return plan
+
+
+def projection(record: type) -> dict:
+    return _plan(record)[0]
+
+
+def parse(record: type, document: dict):
+    _, keys, defaults = _plan(record)
+    return record._make([document.get(key, default) for key, default in zip(keys, defaults)])
+
+
+async def find(collection, record: type, query: dict, limit: int = 0) -> list:
+    documents = await collection.collection.find(query, projection(record), limit=limit).to_list(None)
+    return [parse(record, i) for i in documents]
+
+
+async def find_one(collection, record: type, query: dict):
+    document = await collection.collection.find_one(query, projection(record))
+    return None if document is None else parse(record, document)
+
+
+async def _read_through(cache: TTLCache, key, read):
+    # При недоступной БД отдаёт последнее известное значение, если оно есть
+    value = cache.get(key)
+    if value is not MISSING:
+        return value
+    try:
+        value = await breaker.call(read())
+    except DatabaseUnavailable:
+        value = cache.get_stale(key)
+        if value is MISSING:
+            raise
+        return value
+    cache.set(key, value)
+    return value
+
+
+async def get_user(telegram_id: int) -> UserRecord | None:
+    return await _read_through(users_cache, telegram_id,
+                               lambda: find_one(Database.users, UserRecord, {"telegram_id": telegram_id}))
+
+
+async def get_chat(chat_id: int) -> ChatRecord | None:
+    return await _read_through(chats_cache, chat_id,
+                               lambda: find_one(Database.chats, ChatRecord, {"chat_id": chat_id}))
+
+
+async def _cooler(uid: str) -> CoolerRecord:
+    cooler = await find_one(Database.coolers, CoolerRecord, {"_id": ObjectId(uid)})
+    if cooler is None:
+        raise NotFound({"_id": uid})
+    return cooler
+
+
+async def get_cooler(uid: str) -> CoolerRecord:
+    # NotFound или InvalidId, как у find_one pymotyc
+    return await _read_through(coolers_cache, uid, lambda: _cooler(uid))
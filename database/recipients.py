@@ -0,0 +1,115 @@
+import asyncio
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from database.breaker import breaker
+from database.helper import Database, users_cache, chats_cache, CACHE_TTL, SHARED_CACHES
+from database.periodic import Periodic
+
+
+class RecipientRegistry:
+    """
+    Список получателей уведомлений (пары ("user", telegram_id) и ("chat", chat_id)) в памяти.
+    Обновляется по change stream, а пока он недоступен (нет replica set, сбой БД) — опросом раз в poll_interval.
+    Тот же change stream сбрасывает users_cache и chats_cache по записям других реплик.
+    """
+
+    def __init__(self, poll_interval=60):
+        self.poll_interval = poll_interval
+        self.targets: list[tuple[str, int]] | None = None
+        self.task = None
+        self.refreshing = None
+        self.delay = 1  # Задержка перед повторным открытием change stream
+
+    async def refresh(self):
+        # При недоступной БД остаётся прежний список
+        users = await breaker.call(
+            Database.users.collection.find({"send_notif": True}, {"_id": 0, "telegram_id": 1}).to_list(None))
+        chats = await breaker.call(
+            Database.chats.collection.find({"send_notif": True}, {"_id": 0, "chat_id": 1}).to_list(None))
+        self.targets = [("user", i["telegram_id"]) for i in users] + [("chat", i["chat_id"]) for i in chats]
+
+    async def get(self) -> list[tuple[str, int]]:
+        if self.targets is None:
+            await self.refresh()
+        return self.targets
+
+    def invalidate(self):
+        # Вызывается после записи send_notif, список перечитывается в фоне
+        if self.refreshing is None or self.refreshing.done():
+            self.refreshing = asyncio.create_task(self.refresh())
+
+    async def disable(self, targets: list[tuple[str, int]]):
+        # Отключает уведомления получателям, которым не удалось отправить, одним bulk_write на коллекцию
+        if not targets:
+            return
+        users = [i for kind, i in targets if kind == "user"]
+        chats = [i for kind, i in targets if kind == "chat"]
+        if users:
+            await Database.users.collection.bulk_write(
+                [UpdateOne({"telegram_id": i}, {"$set": {"send_notif": False}}) for i in users], ordered=False)
+        if chats:
+            await Database.chats.collection.bulk_write(
+                [UpdateOne({"chat_id": i}, {"$set": {"send_notif": False}}) for i in chats], ordered=False)
+        for i in users:
+            users_cache.invalidate(i)
+        for i in chats:
+            chats_cache.invalidate(i)
+        disabled = set(targets)
+        if self.targets is not None:
+            self.targets = [i for i in self.targets if i not in disabled]
+
+    @staticmethod
+    def _share_caches(enabled: bool):
+        # Без change stream запись другой реплики не сбросит кэш, поэтому он работает только на get_stale
+        if not SHARED_CACHES:
+            return
+        for cache in (users_cache, chats_cache):
+            cache.ttl = CACHE_TTL if enabled else 0
+            if not enabled:
+                cache.expire()
+
+    @staticmethod
+    def _invalidate_cached(change: dict):
+        if change["ns"]["coll"] == Database.users.name:
+            cache, field = users_cache, "telegram_id"
+        else:
+            cache, field = chats_cache, "chat_id"
+        document = change.get("fullDocument")
+        if document is None or field not in document:
+            cache.expire()  # Документ удалён, ключ кэша неизвестен
+        else:
+            cache.invalidate(document[field])
+
+    async def _watch(self):
+        pipeline = [{"$match": {"ns.coll": {"$in": [Database.users.name, Database.chats.name]}}}]
+        async with Database.users.db.watch(pipeline, full_document="updateLookup") as stream:
+            self.delay = 1
+            self._share_caches(True)
+            try:
+                async for change in stream:
+                    self._invalidate_cached(change)
+                    await self.refresh()
+            finally:
+                self._share_caches(False)
+
+    async def _run(self):
+        # Сбой чтения или потока не останавливает задачу: поток переоткрывается с задержкой, которая растёт
+        # до poll_interval, а каждая попытка перечитывает список — без replica set это и есть опрос
+        while True:
+            try:
+                await self.refresh()
+                await self._watch()
+            except PyMongoError as e:
+                if self.delay == 1:
+                    print(f"Change stream is unavailable, polling recipients: {e}")
+            except (AttributeError, NotImplementedError, TypeError):
+                break  # Локальная замена Mongo не умеет change streams
+            await asyncio.sleep(self.delay)
+            self.delay = min(self.delay * 2, self.poll_interval)
+        await Periodic(self.refresh, self.poll_interval).run()
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
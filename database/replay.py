@@ -0,0 +1,47 @@
+
+from database.breaker import CircuitBreaker, DatabaseUnavailable
+from database.periodic import Periodic
+
+
+class ReplayQueue:
+    """
+    Записи, которые не удалось выполнить из-за недоступности БД, в порядке поступления.
+    Повторяются после замыкания автомата; очередь в памяти процесса и ограничена max_size (старые отбрасываются).
+    """
+
+    def __init__(self, breaker: CircuitBreaker, interval=5.0, max_size=10000):
+        self.breaker = breaker
+        self.max_size = max_size
+        self.items: list[tuple] = []  # (function, args)
+        self.replayer = Periodic(self.replay, interval)
+        self.replayed = 0
+        self.dropped = 0
+
+    def add(self, function, *args):
+        self.items.append((function, args))
+        if len(self.items) > self.max_size:
+            self.items.pop(0)
+            self.dropped += 1
+
+    async def replay(self) -> int:
+        # Выполняет записи по порядку, пока БД отвечает; возвращает количество выполненных
+        count = 0
+        while self.items and not self.breaker.open:
+            function, args = self.items[0]
+            try:
+                await function(*args)
+            except DatabaseUnavailable:
+                break
+            except Exception as e:
+                print(e)  # Запись невыполнима и при доступной БД, повторять бессмысленно
+            self.items.pop(0)
+            count += 1
+        self.replayed += count
+        return count
+
+    def start(self):
+        self.replayer.start()
+
+    async def stop(self):
+        await self.replayer.stop()
+        await self.replay()  # Последняя попытка перед выходом, невыполненное теряется
@@ -0,0 +1,21 @@
+"""
+Периодические задачи: каждый период выполняется один раз, даже после перезапуска или смены ведущей реплики.
+"""
+from datetime import datetime
+
+from pymongo.errors import DuplicateKeyError
+
+from database.helper import Database
+
+
+async def claim(name: str, slot: int) -> bool:
+    # True, если период slot задачи name ещё не выполнялся
+    try:
+        await Database.ticks.collection.update_one(
+            {"name": name, "slot": {"$lt": slot}},
+            {"$set": {"slot": slot, "at": datetime.utcnow()}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False  # Период уже выполнен
+    return True
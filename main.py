@@ -1,4 +1,8 @@
 #!/usr/bin/python
+import asyncio
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 from os import environ
 
 from aiorun import run
@@ -12,29 +16,95 @@ from telebot.async_telebot import AsyncTeleBot
 # noinspection PyPackageRequirements
 from telebot.asyncio_helper import ApiTelegramException
 # noinspection PyPackageRequirements
-from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, Message
+from telebot.types import InlineKeyboardMarkup, CallbackQuery, Message
 # noinspection PyPackageRequirements
-from telebot.util import extract_arguments, antiflood, extract_command
-
-from database import Database, get_user_from_msg
-from database.models import User, Event, Cooler
-from utils import SelfCleaningDict, generate_qr_code
-from utils.middlewares import RegisterMiddleware, HandleBannedMiddleware
-
-# Создание клиентов для БД и телеги
-bot = AsyncTeleBot(environ.get("TELEBOT_TOKEN", ""))
-client = AsyncIOMotorClient(environ.get("DATABASE_URL", ""))
-
-chat_to_get_photo = SelfCleaningDict(3600, 3600)  # Самоочищающийся словарь для хранения типа отсутствия в диалоге
-admins_actions = {}  # Словарь для хранения действий с админами для чатов
-
-bot.setup_middleware(RegisterMiddleware())  # Настройка промежуточного шлюза для регистрации пользователей
-bot.setup_middleware(HandleBannedMiddleware(bot))  # Настройка промежуточного шлюза для проверки бана
-
-
-@bot.message_handler(commands=["coolers"])
-async def handle_coolers(message: Message):
-    user = await get_user_from_msg(message)
+from telebot.util import extract_arguments, extract_command
+
+from database import Database, users_cache, chats_cache, cooler_state, notifications, incidents, outbox, ensure_indexes, EventSink, \
+    ChatSink, RecipientRegistry, get_cooler, breaker, DatabaseUnavailable, ReplayQueue
+from database.models import User, Event, Cooler, OutboxItem, Incident
+from utils import TTLStore, make_backend, Dispatcher, Debouncer, CallbackData, CallbackRouter, report_keyboard, \
+    render_notification, render_digest, render_escalation, render_status, OutboxWorker, best_photo, send_cached_document, \
+    LeaderElection, Scheduler, Quota, RateLimiter, PagedList, render_page
+from utils.metrics import metrics, MongoMetricsListener, instrument_handlers, instrument_telegram, start_metrics_server, \
+    fanout_size
+from utils.middlewares import RegisterMiddleware, HandleBannedMiddleware, MetricsMiddleware, UpdateClassifierMiddleware, \
+    RateLimitMiddleware, RequestContext
+
+# Клиенты для БД и телеги создаются в create_app()
+bot: AsyncTeleBot | None = None
+client: AsyncIOMotorClient | None = None
+classifier: UpdateClassifierMiddleware | None = None
+
+# Несколько реплик (SHARD_COUNT > 1) работают только в режиме webhook, обновления делятся по пользователю
+SHARD_COUNT = int(environ.get("SHARD_COUNT", 1))
+# Ожидаемые действия пользователей, при STATE_URL=redis://... или mongo общие для всех реплик
+STATE_URL = environ.get("STATE_URL") or ("mongo" if SHARD_COUNT > 1 else None)
+chat_to_get_photo = TTLStore(3600, make_backend(STATE_URL, "photo:"))  # Тип отсутствия в диалоге
+admins_actions = TTLStore(3600, make_backend(STATE_URL, "admins:"))  # Действия с админами для чатов
+recipients = RecipientRegistry(int(environ.get("RECIPIENTS_POLL", 60)))  # Получатели уведомлений в памяти
+event_sink = EventSink(int(environ.get("EVENTS_BATCH", 100)), float(environ.get("EVENTS_INTERVAL", 5)))  # Журнал событий
+replay_queue = ReplayQueue(breaker, float(environ.get("REPLAY_INTERVAL", 5)))  # Обращения, пока БД недоступна
+chat_sink = ChatSink(int(environ.get("CHATS_BATCH", 100)), float(environ.get("CHATS_INTERVAL", 5)))  # Групповые чаты
+dispatcher = Dispatcher(int(environ.get("SEND_CONCURRENCY", 16)))  # Параллельная рассылка с учётом лимитов телеграма
+outbox_worker = OutboxWorker(dispatcher, int(environ.get("OUTBOX_WORKERS", 4)))  # Надёжная отправка через outbox
+PAGE_SIZE = int(environ.get("PAGE_SIZE", 20))  # Строк на странице списков
+
+
+def _cooler_line(cooler: dict) -> str:
+    flags = [name for key, name in (("empty_watter", "нет воды"), ("empty_glass", "нет стаканчиков")) if cooler.get(key)]
+    return f"{cooler['name']} - {cooler['_id']}" + (f" ({', '.join(flags)})" if flags else "")
+
+
+def _user_line(user: dict) -> str:
+    return f"{user['name']} - {user['telegram_id']}"
+
+
+_COOLER_FIELDS = {"name": 1, "empty_watter": 1, "empty_glass": 1}
+_USER_FIELDS = {"name": 1, "telegram_id": 1}
+# Списки для /coolers, /banned и /admins, листаются кнопками
+paged_lists = {i.name: i for i in [
+    PagedList("coolers", "Кулеры", Database.coolers, {}, _COOLER_FIELDS, _cooler_line),
+    PagedList("water", "Кулеры без воды", Database.coolers, {"empty_watter": True}, _COOLER_FIELDS, _cooler_line),
+    PagedList("glass", "Кулеры без стаканчиков", Database.coolers, {"empty_glass": True}, _COOLER_FIELDS,
+              _cooler_line),
+    PagedList("banned", "Черный список", Database.users, {"banned": True}, _USER_FIELDS, _user_line),
+    PagedList("admins", "Админы", Database.users, {"admin": True}, _USER_FIELDS, _user_line),
+]}
+
+# Квоты "количество/секунды" на пользователя, а для фотографий ещё и на кулер.
+# RATE_LIMIT_URL — общее хранилище счётчиков, при нескольких репликах по умолчанию mongo, как и STATE_URL
+RATE_LIMIT_URL = environ.get("RATE_LIMIT_URL") or ("mongo" if SHARD_COUNT > 1 else None)
+rate_limiter = RateLimiter({
+    "start": Quota.parse(environ.get("RATE_START", "20/60")),
+    "report": Quota.parse(environ.get("RATE_REPORT", "10/600")),
+    "photo": Quota.parse(environ.get("RATE_PHOTO", "5/600")),
+    "cooler": Quota.parse(environ.get("RATE_COOLER", "30/600")),
+}, make_backend(RATE_LIMIT_URL, "rate:", 100000))
+RATE_BAN_FACTOR = float(environ.get("RATE_BAN_FACTOR", 3))  # Во сколько раз превысить квоту до временного бана
+RATE_BAN_TIME = timedelta(seconds=float(environ.get("RATE_BAN_TIME", 3600)))
+scheduler = Scheduler(float(environ.get("SCHEDULER_TICK", 60)))  # Сводки и эскалация по незаполненным кулерам
+DIGEST_INTERVAL = float(environ.get("DIGEST_INTERVAL", 3600))
+DIGEST_AFTER = timedelta(seconds=float(environ.get("DIGEST_AFTER", 1800)))  # Кулер попадает в сводку
+ESCALATE_AFTER = timedelta(seconds=float(environ.get("ESCALATE_AFTER", 7200)))  # Кулер передаётся can_add_admin
+
+
+def start_jobs():
+    outbox_worker.start()
+    scheduler.start()
+
+
+async def stop_jobs():
+    await scheduler.stop()
+    await outbox_worker.stop()
+
+
+# Фоновые задачи в одном экземпляре: outbox разбирает только ведущая реплика, чтобы не превысить общий лимит телеграма
+leader = LeaderElection("jobs", start_jobs, stop_jobs, float(environ.get("LEADER_TTL", 30)))
+
+
+async def handle_coolers(message: Message, data: dict):
+    user = data["context"].user
 
     if not user.admin:
         return
@@ -43,29 +113,49 @@ async def handle_coolers(message: Message):
 
     match len(args):
         case 0:
-            coolers = await Database.coolers.find({}, inject_default_id=True)
-
-            if not coolers:
-                await bot.reply_to(message, "Кулеров нет")
-                return
-            await bot.reply_to(message, "\n".join([f"{i.name} - {i._id}" for i in coolers]))
+            text, keyboard = await render_page(paged_lists["coolers"], PAGE_SIZE)
+            await bot.reply_to(message, text, reply_markup=keyboard)
         case 1:
             match args[0]:
+                case "water" | "glass":
+                    text, keyboard = await render_page(paged_lists[args[0]], PAGE_SIZE)
+                    await bot.reply_to(message, text, reply_markup=keyboard)
+                case "status":
+                    total, empty = await cooler_state.status()
+                    await bot.reply_to(message, render_status(total, empty, datetime.utcnow()))
                 case "qr":
+                    # qrcode/PIL загружаются только в ветках, которые рисуют коды
+                    from utils.qr_generator import render_qr_code, render_qr_sheet, style_hash, sheet_key, can_label
+
                     coolers = await Database.coolers.find({}, inject_default_id=True)
 
                     if not coolers:
                         await bot.reply_to(message, "Кулеров нет")
                         return
-                    for i in coolers:
-                        await antiflood(bot.send_document, message.chat.id, generate_qr_code(str(i._id)), caption=i.name, visible_file_name="qr.png")
+                    items = [(str(i._id), i.name) for i in coolers]
+                    if not can_label([name for _, name in items]):
+                        # Нет шрифта для названий на листе: коды по одному, название в подписи
+                        for uid, name in items:
+                            await send_cached_document(bot, message.chat.id, uid, style_hash(),
+                                                       lambda uid=uid: render_qr_code(uid), caption=name,
+                                                       visible_file_name="qr.png")
+                        return
+                    # Все коды одним PDF для печати вместо отдельного файла на каждый кулер
+                    await send_cached_document(bot, message.chat.id, sheet_key(items), style_hash(),
+                                               lambda: render_qr_sheet(items), caption="QR-коды кулеров",
+                                               visible_file_name="qr.pdf")
                 case _:
+                    from utils.qr_generator import render_qr_code, style_hash
+
                     try:
                         cooler = await Database.coolers.find_one(_id=str(args[0]), inject_default_id=True)
                     except (InvalidId, NotFound):
                         await bot.reply_to(message, "Кулер не найден")
                         return
-                    await bot.send_document(message.chat.id, generate_qr_code(str(cooler._id)), caption=cooler.name, visible_file_name="qr.png")
+                    # Повторная отправка идёт по file_id без загрузки файла
+                    await send_cached_document(bot, message.chat.id, str(cooler._id), style_hash(),
+                                               lambda: render_qr_code(str(cooler._id)), caption=cooler.name,
+                                               visible_file_name="qr.png")
         case 2:
             match args[0]:
                 case "delete":
@@ -75,21 +165,54 @@ async def handle_coolers(message: Message):
                         await bot.reply_to(message, "Кулер не найден")
                         return
                     await Database.coolers.delete_one(_id=str(args[1]))
+                    from utils.qr_generator import forget_qr_code  # Без qrcode/PIL
+
+                    await forget_qr_code(str(args[1]))
                     await bot.reply_to(message, "Кулер удален")
                 case "add":
+                    from utils.qr_generator import render_qr_code, style_hash
+
                     cooler = await Database.coolers.save(Cooler(name=str(args[1])), inject_default_id=True)
-                    await bot.send_document(message.chat.id, generate_qr_code(str(cooler._id)), caption=f"", visible_file_name="qr.png")
+                    await send_cached_document(bot, message.chat.id, str(cooler._id), style_hash(),
+                                               lambda: render_qr_code(str(cooler._id)), caption=f"",
+                                               visible_file_name="qr.png")
                 case _:
-                    await bot.reply_to(message, "Использование:\n/coolers\n/coolers qr\n/coolers id\n/coolers delete id\n/coolers add name")
+                    await bot.reply_to(message, "Использование:\n/coolers\n/coolers water|glass\n/coolers status\n/coolers qr\n/coolers id\n/coolers delete id\n/coolers add name")
         case _:
-            await bot.reply_to(message, "Использование:\n/coolers\n/coolers qr\n/coolers id\n/coolers delete id\n/coolers add name")
+            await bot.reply_to(message, "Использование:\n/coolers\n/coolers water|glass\n/coolers status\n/coolers qr\n/coolers id\n/coolers delete id\n/coolers add name")
 
 
 
+# Статистика надёжности по журналу событий
+async def handle_stats(message: Message, data: dict):
+    user = data["context"].user
+
+    if not user.admin:
+        return
+
+    from database import analytics
+
+    names = {str(i._id): i.name for i in await Database.coolers.find({}, inject_default_id=True)}
+
+    reports = {}
+    for i in await analytics.reports_per_cooler("day", 7):
+        reports[i["_id"]["cooler_id"]] = reports.get(i["_id"]["cooler_id"], 0) + i["reports"]
+    lines = ["Обращения за 7 дней:"]
+    lines += [f"{names.get(k, k)} - {v}" for k, v in sorted(reports.items(), key=lambda x: -x[1])] or ["нет"]
+
+    lines.append("\nВремя до загрузки за 7 дней (среднее / максимум, мин):")
+    lines += [f"{names.get(i['_id'], i['_id'])} - {i['avg_seconds'] / 60:.0f} / {i['max_seconds'] / 60:.0f}"
+              for i in await analytics.time_to_reset(7)] or ["нет"]
+
+    lines.append("\nЧаще всего сообщают за 30 дней:")
+    lines += [f"{i['_id']} - {i['reports']}" for i in await analytics.top_reporters(5, 30)] or ["нет"]
+
+    await bot.reply_to(message, "\n".join(lines))
+
+
 # Обработка команд для бана/разбана пользователей
-@bot.message_handler(commands=["ban", "unban"])
-async def handle_ban(message: Message):
-    user = await get_user_from_msg(message)
+async def handle_ban(message: Message, data: dict):
+    user = data["context"].user
 
     if not user.admin:  # Проверяем является ли пользователь админом
         return
@@ -102,9 +225,11 @@ async def handle_ban(message: Message):
                 "telegram_id": uid
             }, update={
                 "$set": {
-                    "banned": extract_command(message.text) == "ban"
+                    "banned": extract_command(message.text) == "ban",
+                    "banned_until": None
                 }
             })
+            users_cache.invalidate(uid)
 
             await bot.reply_to(message, f"Изменения произведены\nId пользователя: {uid}")  # Оповещаем пользователя
         except NotFound:
@@ -115,9 +240,17 @@ async def handle_ban(message: Message):
         await bot.reply_to(message, "Использование:\n/ban id\n/unban id")
 
 
-@bot.message_handler(commands=["chat"])
-async def handle_chat(message: Message):
-    user = await get_user_from_msg(message)
+# Черный список и админы постранично
+async def handle_list(message: Message, data: dict):
+    if not data["context"].user.admin:
+        return
+
+    text, keyboard = await render_page(paged_lists[extract_command(message.text)], PAGE_SIZE)
+    await bot.reply_to(message, text, reply_markup=keyboard)
+
+
+async def handle_chat(message: Message, data: dict):
+    user = data["context"].user
 
     if not user.admin:
         return
@@ -140,6 +273,8 @@ async def handle_chat(message: Message):
                         "send_notif": arguments[0] == "true"
                     }
                 })
+                chats_cache.invalidate(message.chat.id)
+                recipients.invalidate()
 
                 await bot.reply_to(message, f"Изменения произведены\nId чата: {message.chat.id}")
             case _:
@@ -149,9 +284,8 @@ async def handle_chat(message: Message):
 
 
 # Обработка редактирования администраторов
-@bot.message_handler(commands=["admin"])
-async def handle_admin(message: Message):
-    user = await get_user_from_msg(message)
+async def handle_admin(message: Message, data: dict):
+    user = data["context"].user
 
     if not user.can_add_admin:  # Проверяем может ли пользователь изменять админов
         return
@@ -175,13 +309,15 @@ async def handle_admin(message: Message):
                         "send_notif": arguments[1] == "true"
                     }
                 })
+                users_cache.invalidate(int(arguments[0]))
+                recipients.invalidate()
                 await bot.reply_to(message, f"Изменения произведены\nId пользователя: {arguments[0]}")
             case 1:
                 if arguments[0] not in ["true", "false"]:
                     raise ValueError
 
                 await bot.reply_to(message, "Перешлите сообщение от пользователя")
-                admins_actions[message.from_user.id] = arguments[0]
+                await admins_actions.set(message.from_user.id, arguments[0])
             case _:
                 raise ValueError
     except (AttributeError, ValueError):
@@ -189,14 +325,14 @@ async def handle_admin(message: Message):
 
 
 # Обработка редактирования администраторов через пересланное сообщение
-@bot.message_handler(func=lambda message: message.forward_from is not None)
-async def handle_forwarded_for_admin(message: Message):
-    user = await get_user_from_msg(message)
+async def handle_forwarded_for_admin(message: Message, data: dict):
+    user = data["context"].user
 
     if not user.can_add_admin:  # Проверяем может ли пользователь изменять админов
         return
 
-    if message.from_user.id not in admins_actions.keys():  # Проверяем запрашивал ли пользователь действия
+    action = await admins_actions.get(message.from_user.id)
+    if action is None:  # Проверяем запрашивал ли пользователь действия
         return
 
     if message.chat.type != "private":
@@ -212,24 +348,62 @@ async def handle_forwarded_for_admin(message: Message):
         user_to_edit = User(telegram_id=message.forward_from.id, name=message.forward_from.first_name)
 
     # Вносим изменения
-    user_to_edit.admin = admins_actions[message.from_user.id] == "true"
-    user_to_edit.send_notif = admins_actions[message.from_user.id] == "true"
+    user_to_edit.admin = action == "true"
+    user_to_edit.send_notif = action == "true"
 
     # Отмечаем действие выполненным, сохраняем БД, отправляем уведомление
-    del admins_actions[message.from_user.id]
+    await admins_actions.delete(message.from_user.id)
     await Database.users.save(user_to_edit)
+    users_cache.invalidate(message.forward_from.id)
+    recipients.invalidate()
     await bot.reply_to(message, f"Изменения произведены\nId пользователя: {message.forward_from.id}")
 
 
+async def throttled(name: str, key, telegram_id: int) -> bool:
+    """
+    True, если действие нужно отклонить по квоте name.
+    Кто превышает квоту в RATE_BAN_FACTOR раз, временно банится; квота кулера никого не банит.
+    Пока общее хранилище счётчиков недоступно, ничего не отклоняется.
+    """
+    try:
+        load = await rate_limiter.check(name, key)
+    except DatabaseUnavailable:
+        return False
+    if load <= 1:
+        return False
+    if name != "cooler" and load > RATE_BAN_FACTOR:
+        until = datetime.utcnow() + RATE_BAN_TIME
+        try:
+            # Постоянный бан не заменяем временным
+            result = await breaker.call(Database.users.collection.update_one(
+                {"telegram_id": telegram_id, "banned": False}, {"$set": {"banned": True, "banned_until": until}}))
+        except DatabaseUnavailable:
+            return True
+        users_cache.invalidate(telegram_id)
+        if result.modified_count:
+            await bot.send_message(telegram_id, "Слишком много обращений, вы временно заблокированы")
+    return True
+
+
+async def lift_bans(slot: int):
+    # Снимает истёкшие временные баны
+    query = {"banned": True, "banned_until": {"$lte": datetime.utcnow()}}
+    expired = await Database.users.collection.find(query, {"_id": 0, "telegram_id": 1}).to_list(None)
+    if not expired:
+        return
+    await Database.users.collection.update_many(query, {"$set": {"banned": False, "banned_until": None}})
+    for i in expired:
+        users_cache.invalidate(i["telegram_id"])
+
+
 # Обрабатываем начало диалога
-@bot.message_handler(commands=['start'])
 async def handle_start(message: Message):
     if message.chat.type != "private":
         return
 
     uid = extract_arguments(message.text)
     try:
-        cooler = await Database.coolers.find_one(_id=uid, inject_default_id=True)
+        cooler = await get_cooler(uid)  # Пока БД недоступна — последнее известное состояние
 
         if cooler.empty_glass and cooler.empty_watter:  # Уведомляем, что мы уже знаем об отсутствии всего
             await bot.reply_to(message, "Отсутствие воды и стаканчиков уже зарегистрировано")
@@ -241,20 +415,231 @@ async def handle_start(message: Message):
             await bot.reply_to(message, "Отсутствие воды уже зарегистрировано")
 
         # inline клавиатура для отправки обращений
-        keyboard = InlineKeyboardMarkup().row(
-            InlineKeyboardButton("Нет стаканчиков", callback_data=f"{uid} no_glass"),
-            InlineKeyboardButton("Нет воды", callback_data=f"{uid} no_water")
-        ).row(
-            InlineKeyboardButton("Нет стаканчиков и воды", callback_data=f"{uid} no_all")
-        )
+        keyboard = report_keyboard(uid, cooler)
         await bot.reply_to(message, "Выберите, чего не хватает", reply_markup=keyboard)
     except (AssertionError, InvalidId, NotFound):
         # Пользователь использовал команду /start не через qr-код
         await bot.reply_to(message, "Отсканируйте qr-код на кулере")
+    except DatabaseUnavailable:
+        await bot.reply_to(message, "Сервис временно недоступен, попробуйте позже")
+
+
+# Операции телеграма, которые выполняет outbox_worker
+async def send_photo(chat_id: int, photo: str, caption: str, reply_markup: str):
+    return await bot.send_photo(chat_id, photo, caption, reply_markup=reply_markup)
+
+
+async def edit_caption(chat_id: int, message_id: int, caption: str, reply_markup: str):
+    return await bot.edit_message_caption(caption, chat_id, message_id, reply_markup=reply_markup)
+
+
+async def edit_markup(chat_id: int, message_id: int, reply_markup: str):
+    return await bot.edit_message_reply_markup(chat_id, message_id, reply_markup=reply_markup)
+
+
+async def delete_message(chat_id: int, message_id: int):
+    return await bot.delete_message(chat_id, message_id)
+
+
+async def send_message(chat_id: int, text: str):
+    return await bot.send_message(chat_id, text)
+
+
+async def notification_sent(item: dict, result: Message, stale: bool):
+    context = item["context"]
+    await notifications.add(context["cooler_id"], context["incident_id"], [(result.chat.id, result.id)])
+    if not stale:
+        return
+    # Пока уведомление отправлялось, случай изменился или закрылся
+    current = await outbox.get(item["_id"])
+    if current is not None and current["context"].get("cancelled"):
+        await outbox_worker.enqueue([OutboxItem(key=f"delete:{result.chat.id}:{result.id}", method="delete_message",
+                                                chat_id=result.chat.id, args=[result.id])])
+    else:
+        incident_updates.trigger((context["cooler_id"], context["incident_id"]))
+
+
+async def notification_failed(failures: list[tuple[dict, Exception]]):
+    # Бот заблокирован, чат удалён и т.п.: все получатели за проход отключаются одним bulk_write
+    await recipients.disable([(item["context"]["kind"], item["chat_id"])
+                              for item, error in failures if isinstance(error, ApiTelegramException)])
+
+
+async def notification_lost(failures: list[tuple[dict, Exception]]):
+    # Сообщения удалены
+    await notifications.remove([(item["chat_id"], item["args"][0])
+                                for item, error in failures if isinstance(error, ApiTelegramException)])
+
+
+outbox_worker.register("send_photo", send_photo, notification_sent, notification_failed)
+outbox_worker.register("edit_caption", edit_caption, failed=notification_lost)
+outbox_worker.register("edit_markup", edit_markup, failed=notification_lost)
+outbox_worker.register("delete_message", delete_message)
+outbox_worker.register("send_message", send_message, failed=notification_failed)
+
+
+def notification_edits(uid: str, incident_id: str, batch: list[tuple[int, int]], caption: str | None,
+                       markup: str) -> list[OutboxItem]:
+    # Повторная правка того же сообщения заменяет ещё не выполненную
+    context = {"cooler_id": uid, "incident_id": incident_id}
+    if caption is None:
+        return [OutboxItem(key=f"edit:{chat_id}:{message_id}", method="edit_markup", chat_id=chat_id,
+                           args=[message_id], kwargs={"reply_markup": markup}, context=context, replace=True)
+                for chat_id, message_id in batch]
+    return [OutboxItem(key=f"edit:{chat_id}:{message_id}", method="edit_caption", chat_id=chat_id,
+                       args=[message_id, caption], kwargs={"reply_markup": markup}, context=context, replace=True)
+            for chat_id, message_id in batch]
+
+
+async def refresh_incident(key: tuple[str, str]):
+    # Одна правка всех уведомлений случая по текущему состоянию, сколько бы обращений ни пришло
+    uid, incident_id = key
+    try:
+        cooler = await Database.coolers.find_one(_id=uid, inject_default_id=True)
+    except (InvalidId, NotFound):
+        return
+    flags = {i for i in ("empty_watter", "empty_glass") if getattr(cooler, i)}
+    if cooler.incident_id != incident_id or not flags:
+        return  # Случай уже закрыт
+
+    incident = await incidents.get(incident_id)
+    caption, keyboard = render_notification(uid, cooler.name, flags, incident_id, incident)
+    markup = keyboard.to_json()
+    # Ещё не отправленные уведомления уйдут сразу в актуальном виде
+    await outbox.update_pending({"method": "send_photo", "context.incident_id": incident_id},
+                                {"kwargs.caption": caption, "kwargs.reply_markup": markup})
+    async for batch in notifications.batches(uid, incident_id):
+        # Старые уведомления без случая: подпись не восстановить, меняем только кнопки
+        await outbox_worker.enqueue(notification_edits(uid, incident_id, batch, incident and caption, markup))
+
+
+# Правки уведомлений по случаю откладываются на INCIDENT_WINDOW секунд и схлопываются
+incident_updates = Debouncer(float(environ.get("INCIDENT_WINDOW", 3)), refresh_incident)
+
+
+async def send_digest(slot: int):
+    # Раз в DIGEST_INTERVAL одна сводка каждому подписчику, ключ outbox не даёт отправить её дважды.
+    # В сводку попадают и уже переданные кулеры: они пустуют дольше всех
+    coolers = await cooler_state.overdue(datetime.utcnow() - DIGEST_AFTER)
+    if not coolers:
+        return
+    text = render_digest(coolers, datetime.utcnow())
+    await outbox_worker.enqueue([
+        OutboxItem(key=f"digest:{slot}:{chat_id}", method="send_message", chat_id=chat_id, args=[text],
+                   context={"kind": kind})
+        for kind, chat_id in await recipients.get()
+    ])
+
+
+async def escalate(slot: int):
+    # Случаи дольше ESCALATE_AFTER передаются пользователям с can_add_admin, каждый случай один раз
+    now = datetime.utcnow()
+    coolers = await cooler_state.overdue(now - ESCALATE_AFTER, escalated=False)
+    if not coolers:
+        return
+    users = await Database.users.collection.find({"can_add_admin": True}, {"_id": 0, "telegram_id": 1}).to_list(None)
+    await outbox_worker.enqueue([
+        OutboxItem(key=f"escalate:{cooler.incident_id}:{user['telegram_id']}", method="send_message",
+                   chat_id=user["telegram_id"], args=[render_escalation(cooler, now)], context={"kind": "user"})
+        for cooler in coolers for user in users
+    ])
+    await cooler_state.mark_escalated([i.incident_id for i in coolers])
+
+
+scheduler.add("digest", DIGEST_INTERVAL, send_digest)
+scheduler.add("escalate", scheduler.tick, escalate)
+scheduler.add("lift_bans", scheduler.tick, lift_bans)
+
+
+@dataclass
+class Report:
+    """
+    Обращение с фотографией. submit() выполняет шаги по порядку и запоминает выполненные,
+    поэтому после DatabaseUnavailable повтор из replay_queue продолжает с невыполненного шага, а не начинает заново.
+    """
+    uid: str
+    status: str
+    user_id: int
+    username: str
+    photo: str
+    attempts: int = 0
+    marked: bool = False
+    cooler: Cooler | None = None  # Кулер до обращения, None — обращение уже было зарегистрировано
+    incident: Incident | None = None
+
+    @property
+    def author(self) -> str:
+        return f"@{self.username}, id: {self.user_id}"
+
+    async def submit(self) -> str:
+        self.attempts += 1
+        if not self.marked:
+            # Атомарно регистрируем обращение, повторное отклоняется на уровне БД
+            self.cooler = await breaker.call(cooler_state.mark_empty(self.uid, self.status))
+            if self.cooler is None and self.attempts > 1:
+                self.cooler = await self._unsent()
+            self.marked = True
+
+        if self.cooler is None:
+            # Повторное обращение только добавляется к открытому случаю
+            incident_id = await breaker.call(cooler_state.get_incident_id(self.uid))
+            if self.incident is None:
+                self.incident = await breaker.call(
+                    incidents.attach(incident_id, self.uid, self.user_id, self.author, self.photo))
+            incident_updates.trigger((self.uid, incident_id))
+            return "Обращение уже зарегистрировано, спасибо"
+
+        incident_id = self.cooler.incident_id
+        if self.incident is None:
+            self.incident = await breaker.call(
+                incidents.attach(incident_id, self.uid, self.user_id, self.author, self.photo))
+            event_sink.add(
+                Event(
+                    type=self.status,
+                    from_id=self.user_id,
+                    cooler_id=self.uid,
+                    description=f"@{self.username} sent {self.status} event cooler {self.uid}"
+                )
+            )
+
+        if self.cooler.empty_watter or self.cooler.empty_glass:
+            # Кулер уже был пустым: вместо новой рассылки одна отложенная правка уже отправленных уведомлений
+            incident_updates.trigger((self.uid, incident_id))
+            return "Спасибо за обращение"
+
+        flags = set(cooler_state.REPORT_FLAGS[self.status])
+        caption, keyboard = render_notification(self.uid, self.cooler.name, flags, incident_id, self.incident)
+
+        # Ставим уведомления всем подписанным пользователям и чатам в outbox, отправляет их outbox_worker.
+        # Ключи операций по случаю и получателю, поэтому повтор дописывает только недостающие.
+        # Правки случая ждут, пока рассылка не окажется в outbox
+        async with incident_updates.hold((self.uid, incident_id)):
+            markup = keyboard.to_json()
+            targets = await recipients.get()
+            if metrics.enabled:
+                fanout_size.observe(len(targets), method="send_photo")
+            await breaker.call(outbox_worker.enqueue([
+                OutboxItem(key=f"send:{incident_id}:{chat_id}", method="send_photo", chat_id=chat_id,
+                           args=[self.photo], kwargs={"caption": caption, "reply_markup": markup},
+                           context={"cooler_id": self.uid, "incident_id": incident_id, "kind": kind})
+                for kind, chat_id in targets
+            ]))
+        return "Спасибо за обращение"
+
+    async def _unsent(self) -> Cooler | None:
+        """
+        Прошлая попытка могла отметить кулер, не дождавшись ответа БД. Если по текущему случаю
+        ещё нет рассылки, возвращает кулер в состоянии до обращения, чтобы разослать уведомления.
+        """
+        cooler = await breaker.call(Database.coolers.find_one(_id=self.uid, inject_default_id=True))
+        if cooler.incident_id is None or await breaker.call(outbox.broadcast_started(cooler.incident_id)) or \
+                await breaker.call(notifications.exists(self.uid, cooler.incident_id)):
+            return None
+        cooler.empty_watter = cooler.empty_glass = False
+        return cooler
 
 
 # Обработка отправленной фотографии
-@bot.message_handler(content_types=["photo"])
 async def photo_handler(message: Message):
     if message.chat.type != "private":
         return
@@ -263,248 +648,267 @@ async def photo_handler(message: Message):
         return
 
     # Смотрим, какую кнопку нажал пользователь
-    chat_to_get_photo.prone()
-    try:
-        uid, status = chat_to_get_photo[message.from_user.id]
-        del chat_to_get_photo[message.from_user.id]
-    except KeyError:
+    pending = await chat_to_get_photo.pop(message.from_user.id)
+    if pending is None:
         await bot.reply_to(message, "Попробуйте отсканировать код еще раз")
         return
+    uid, status = pending
+
+    # Много обращений по одному кулеру подряд не должны каждый раз править уведомления всех подписчиков
+    if await throttled("cooler", uid, message.from_user.id):
+        await bot.reply_to(message, "Слишком много обращений, попробуйте позже")
+        return
 
+    if status not in cooler_state.REPORT_FLAGS:
+        await bot.reply_to(message, "Ты как сюда попал?\nНапиши @pihta24")
+        return
+
+    photo = best_photo(message.photo)  # Раньше рассылалась самая маленькая миниатюра
+    report = Report(uid, status, message.from_user.id, message.from_user.username, photo)
     try:
-        cooler = await Database.coolers.find_one(_id=uid, inject_default_id=True)
+        reply = await report.submit()
     except (InvalidId, NotFound):
-        await bot.reply_to(message, "Отсканируйте qr-код на кулере")
-        return
+        reply = "Отсканируйте qr-код на кулере"
+    except DatabaseUnavailable:
+        # Обращение зарегистрируется, когда БД снова ответит, с того шага, на котором остановилось
+        replay_queue.add(report.submit)
+        reply = "Спасибо за обращение, оно будет зарегистрировано в ближайшее время"
+    await bot.reply_to(message, reply)
 
-    keyboard = InlineKeyboardMarkup()
-
-    match status:
-        case "no_water":
-            if cooler.empty_watter:
-                await bot.reply_to(message, "Обращение уже зарегистрировано")
-                return
-            m = "Закончилась вода в кулере: "
-            cooler.empty_watter = True
-            keyboard.row(InlineKeyboardButton("Вода загружена", callback_data=f"{uid} reset_water"))
-        case "no_glass":
-            if cooler.empty_glass:
-                await bot.reply_to(message, "Обращение уже зарегистрировано")
-                return
-            m = "Закончились стаканчики в кулере: "
-            cooler.empty_glass = True
-            keyboard.row(InlineKeyboardButton("Стаканчики загружены", callback_data=f"{uid} reset_glass"))
-        case "no_all":
-            if cooler.empty_watter and cooler.empty_glass:
-                await bot.reply_to(message, "Обращение уже зарегистрировано")
-                return
-            m = "Закончились стаканчики и вода в кулере: "
-            cooler.empty_glass = True
-            cooler.empty_watter = True
-            keyboard.row(
-                InlineKeyboardButton("Стаканчики загружены", callback_data=f"{uid} reset_glass"),
-                InlineKeyboardButton("Вода загружена", callback_data=f"{uid} reset_water")
-            ).row(
-                InlineKeyboardButton("Вода и cтаканчики загружены", callback_data=f"{uid} reset_all")
-            )
-        case _:
-            await bot.reply_to(message, "Ты как сюда попал?\nНапиши @pihta24")
-            return
 
-    # Если уже есть нерешенные задачи, значит кулер пустой
-    if len(cooler.sent_messages) != 0:
-        keyboard = InlineKeyboardMarkup()
-        keyboard.row(
-            InlineKeyboardButton("Стаканчики загружены", callback_data=f"{uid} reset_glass"),
-            InlineKeyboardButton("Вода загружена", callback_data=f"{uid} reset_water")
-        ).row(
-            InlineKeyboardButton("Вода и cтаканчики загружены", callback_data=f"{uid} reset_all")
-        )
+# Обработчики inline кнопок по действиям, вызываются из handle_inline_keyboard
+callbacks = CallbackRouter()
 
-    m += f"'{cooler.name}'\nОтправил @{message.from_user.username}, id: {message.from_user.id}"
-    keyboard.row(InlineKeyboardButton("Взялся за работу", callback_data=f"{uid} take"))
-    keyboard.row(InlineKeyboardButton("Забанить", callback_data=f"{message.from_user.id} ban"))
 
-    if len(cooler.sent_messages) != 0:
-        for i, j in cooler.sent_messages:
-            try:
-                await antiflood(bot.edit_message_reply_markup, i, j, reply_markup=keyboard)
-            except ApiTelegramException as e:
-                print(e)
-                del cooler.sent_messages[cooler.sent_messages.index([i, j])]
+@callbacks.route("empty")
+async def on_empty(query: CallbackQuery, payload: CallbackData, context: RequestContext):
+    # Заглушка для кнопок, которые просто показывают информацию
+    await bot.answer_callback_query(query.id)
 
-    for i in await Database.users.find({"send_notif": True}, inject_default_id=True):
-        try:
-            msg = await antiflood(bot.send_photo, i.telegram_id, message.photo[0].file_id, m, reply_markup=keyboard)
-            cooler.sent_messages.append([msg.chat.id, msg.id])
-        except ApiTelegramException as e:
-            print(e)
-            i.send_notif = False
-            await Database.users.save(i)
-
-    for i in await Database.chats.find({"send_notif": True}, inject_default_id=True):
-        try:
-            msg = await antiflood(bot.send_photo, i.chat_id, message.photo[0].file_id, m, reply_markup=keyboard)
-            cooler.sent_messages.append([msg.chat.id, msg.id])
-        except ApiTelegramException as e:
-            print(e)
-            i.send_notif = False
-            await Database.chats.save(i)
-
-    await Database.coolers.save(cooler)
-    await Database.events.save(
+
+@callbacks.route("no_water", "no_glass", "no_all")
+async def on_report(query: CallbackQuery, payload: CallbackData, context: RequestContext):
+    # Состояние кулера проверяется атомарно при получении фотографии, здесь в БД не ходим
+    try:
+        await bot.answer_callback_query(query.id, "Пожалуйста, отправьте фотографию")
+        await bot.edit_message_text("Отправьте фотографию", query.message.chat.id, query.message.id,
+                                    reply_markup=InlineKeyboardMarkup())
+    finally:
+        await chat_to_get_photo.set(query.from_user.id, (payload.target, payload.action))
+
+
+@callbacks.route("reset_water", "reset_glass", "reset_all", staff=True)
+async def on_reset(query: CallbackQuery, payload: CallbackData, context: RequestContext):
+    uid = payload.target
+    try:
+        cooler = await cooler_state.reset(uid, payload.action, payload.incident)
+    except (InvalidId, NotFound):
+        if payload.incident is None:
+            await bot.answer_callback_query(query.id, "Произошла ошибка")
+            return
+        await bot.answer_callback_query(query.id, "Уведомление устарело")
+        if await cooler_state.get_incident_id(uid) == payload.incident:
+            # Случай открыт, но этот флаг уже сброшен: кнопки обновит отложенная правка уведомлений
+            incident_updates.trigger((uid, payload.incident))
+        else:
+            # Случай, для которого нарисована кнопка, уже закрыт
+            await bot.edit_message_reply_markup(query.message.chat.id, query.message.id,
+                                                reply_markup=InlineKeyboardMarkup())
+        return
+
+    # Кулер полностью заполнен — уведомления больше не нужны
+    if not cooler.empty_watter and not cooler.empty_glass:
+        await outbox.cancel({"context.incident_id": cooler.incident_id})
+        async for batch in notifications.batches(uid, cooler.incident_id):
+            await outbox_worker.enqueue([
+                OutboxItem(key=f"delete:{chat_id}:{message_id}", method="delete_message", chat_id=chat_id,
+                           args=[message_id])
+                for chat_id, message_id in batch
+            ])
+        await notifications.close(uid, cooler.incident_id)
+        await incidents.close(cooler.incident_id)
+    else:
+        async with incident_updates.hold((uid, cooler.incident_id)):
+            await refresh_incident((uid, cooler.incident_id))
+    event_sink.add(
         Event(
-            type=status,
-            from_id=message.from_user.id,
-            description=f"@{message.from_user.username} sent {status} event cooler {cooler._id}"
+            type=payload.action,
+            from_id=query.from_user.id,
+            cooler_id=uid,
+            description=f"@{query.from_user.username} sent {payload.action} event cooler {uid}"
         )
     )
+    await bot.answer_callback_query(query.id, "Изменения внесены")
+
+
+@callbacks.route("take", staff=True)
+async def on_take(query: CallbackQuery, payload: CallbackData, context: RequestContext):
+    uid, incident_id = payload.target, payload.incident
+    if incident_id is None:
+        try:
+            incident_id = await cooler_state.get_incident_id(uid)
+        except (InvalidId, NotFound):
+            await bot.answer_callback_query(query.id, "Произошла ошибка")
+            return
+    if await incidents.take(incident_id, uid, query.from_user.username) is None:
+        await bot.answer_callback_query(query.id, "За работу уже взялись")
+        return
+    async with incident_updates.hold((uid, incident_id)):
+        await refresh_incident((uid, incident_id))
+    await bot.answer_callback_query(query.id)
 
-    await bot.reply_to(message, "Спасибо за обращение")
 
+@callbacks.route("ban", staff=True)
+async def on_ban(query: CallbackQuery, payload: CallbackData, context: RequestContext):
+    try:
+        await Database.users.update_one({"telegram_id": payload.target},
+                                        update={"$set": {"banned": True, "banned_until": None}})
+    except NotFound:
+        await bot.answer_callback_query(query.id, "Пользователь не найден")
+        return
+    users_cache.invalidate(payload.target)
+    await bot.answer_callback_query(query.id, "Пользователь внесен в черный список")
 
-# Обрабатываем все запросы от inline кнопок
-@bot.callback_query_handler(lambda query: query.message is not None)
-async def handle_inline_keyboard(query: CallbackQuery):
-    if query.message.chat.type != "private":
-        from_chat = await Database.chats.find_one({"chat_id": query.message.chat.id}, inject_default_id=True)
-        if not from_chat or not from_chat.send_notif:
-            from_chat = None
-    else:
-        from_chat = None
-    user = await Database.users.find_one({"telegram_id": query.from_user.id}, inject_default_id=True)
-    if user.banned:  # Проверяем, не в бане ли пользователь
-        await bot.answer_callback_query(query.id, "Вы находитесь в черном списке")
+
+@callbacks.route(*[f"{name}_{direction}" for name in paged_lists for direction in ("prev", "next")])
+async def on_page(query: CallbackQuery, payload: CallbackData, context: RequestContext):
+    if not context.user.admin:
+        await bot.answer_callback_query(query.id)
         return
+    name, direction = payload.action.rsplit("_", 1)
+    cursor = {"after" if direction == "next" else "before": payload.target}
+    text, keyboard = await render_page(paged_lists[name], PAGE_SIZE, **cursor)
+    await bot.answer_callback_query(query.id)
+    await bot.edit_message_text(text, query.message.chat.id, query.message.id, reply_markup=keyboard)
+
+
+# Обрабатываем все запросы от inline кнопок
+async def handle_inline_keyboard(query: CallbackQuery, data: dict):
+    context: RequestContext = data["context"]
+    # Кнопки в чате работают для всех, если чат подписан на уведомления
+    staff = context.user.admin or (context.chat is not None and context.chat.send_notif)
 
     # Ловим все ошибки, чтобы не крутилась загрузка у пользователя, если упадёт
     try:
-        if query.data == "empty":  # Заглушка для кнопок, которые просто показывают информацию
-            await bot.answer_callback_query(query.id)
+        try:
+            payload = CallbackData.decode(query.data)
+        except ValueError:
+            await bot.answer_callback_query(query.id, "Отсканируйте qr-код на кулере")
             return
-
-        uid, status = query.data.split()
-        if status.startswith("no_"):
-            try:
-                cooler = await Database.coolers.find_one(_id=uid, inject_default_id=True)
-            except (InvalidId, NotFound):
-                try:
-                    await bot.answer_callback_query(query.id, "Отсканируйте qr-код на кулере")
-                    await bot.edit_message_reply_markup(query.message.chat.id, query.message.id,
-                                                        reply_markup=InlineKeyboardMarkup())
-                    await bot.edit_message_text("Отсканируйте qr-код на кулере", query.message.chat.id,
-                                                query.message.id)
-                finally:
-                    return
-            if status not in ["no_water", "no_glass", "no_all"]:
-                try:
-                    await bot.answer_callback_query(query.id, "Отсканируйте qr-код на кулере")
-                    await bot.edit_message_reply_markup(query.message.chat.id, query.message.id,
-                                                        reply_markup=InlineKeyboardMarkup())
-                    await bot.edit_message_text("Отсканируйте qr-код на кулере", query.message.chat.id,
-                                                query.message.id)
-                finally:
-                    return
-            if (status == "no_water" and cooler.empty_watter) or \
-                    (status == "no_glass" and cooler.empty_glass) or \
-                    (status == "no_all" and cooler.empty_watter and cooler.empty_glass):
-                try:
-                    await bot.answer_callback_query(query.id, "Обращение уже зарегистрировано")
-                    await bot.edit_message_reply_markup(query.message.chat.id, query.message.id,
-                                                        reply_markup=InlineKeyboardMarkup())
-                    await bot.edit_message_text("Обращение уже зарегистрировано", query.message.chat.id,
-                                                query.message.id)
-                finally:
-                    return
-            try:
-                await bot.answer_callback_query(query.id, "Пожалуйста, отправьте фотографию")
-                await bot.edit_message_reply_markup(query.message.chat.id, query.message.id,
-                                                    reply_markup=InlineKeyboardMarkup())
-                await bot.edit_message_text("Отправьте фотографию", query.message.chat.id,
-                                            query.message.id)
-            finally:
-                chat_to_get_photo[query.from_user.id] = (uid, status)
-        elif status.startswith("reset_") and (user.admin or from_chat):
-            try:
-                cooler = await Database.coolers.find_one(_id=uid, inject_default_id=True)
-            except (InvalidId, NotFound):
-                await bot.answer_callback_query(query.id, "Произошла ошибка")
-                return
-
-            keyboard = query.message.reply_markup.keyboard
-
-            match status:
-                case "reset_water":
-                    if len(keyboard[0]) == 2:
-                        del keyboard[0][1]
-                        del keyboard[1]
-                    else:
-                        del keyboard[0]
-                    cooler.empty_watter = False
-                case "reset_glass":
-                    if len(keyboard[0]) == 2:
-                        del keyboard[0][0]
-                        del keyboard[1]
-                    else:
-                        del keyboard[0]
-                    cooler.empty_glass = False
-                case "reset_all":
-                    del keyboard[0]
-                    del keyboard[1]
-                    cooler.empty_glass = False
-                    cooler.empty_watter = False
-
-            for i, j in cooler.sent_messages:
-                try:
-                    if len(keyboard) == 2:
-                        await antiflood(bot.delete_message, i, j)
-                    else:
-                        await antiflood(bot.edit_message_reply_markup, i, j,
-                                        reply_markup=InlineKeyboardMarkup(keyboard))
-                except ApiTelegramException as e:
-                    print(e)
-                    del cooler.sent_messages[cooler.sent_messages.index([i, j])]
-
-            if len(keyboard) == 2:
-                cooler.sent_messages = []
-
-            await Database.coolers.save(cooler)
-            await bot.answer_callback_query(query.id, "Изменения внесены")
-        elif status == "ban" and (user.admin or from_chat):
-            user_to_ban = await Database.users.find({"telegram_id": int(uid)}, inject_default_id=True)
-            if not user_to_ban:
-                await bot.answer_callback_query(query.id, "Пользователь не найден")
-                return
-            user_to_ban[0].banned = True
-            await Database.users.save(user_to_ban[0])
-            await bot.answer_callback_query(query.id, "Пользователь внесен в черный список")
-        elif status == "take" and (user.admin or from_chat):
-            try:
-                cooler = await Database.coolers.find_one(_id=uid, inject_default_id=True)
-            except (InvalidId, NotFound):
-                await bot.answer_callback_query(query.id, "Произошла ошибка")
-                return
-            keyboard = query.message.reply_markup.keyboard
-            keyboard[-2][0] = InlineKeyboardButton(f"Взялся: @{query.from_user.username}", callback_data="empty")
-            for i, j in cooler.sent_messages:
-                try:
-                    await antiflood(bot.edit_message_reply_markup, i, j, reply_markup=InlineKeyboardMarkup(keyboard))
-                except ApiTelegramException as e:
-                    print(e)
-                    del cooler.sent_messages[cooler.sent_messages.index([i, j])]
-            await Database.coolers.save(cooler)
-            await bot.answer_callback_query(query.id)
-        else:
+        route = callbacks.resolve(payload.action)
+        if route is None or (route.staff and not staff):
             await bot.answer_callback_query(
                 query.id, "Теоретически, ты не можешь это видеть, но, похоже, мы что-то забыли\nНапиши @pihta24")
+            return
+        await route.function(query, payload, context)
     except Exception as e:
         print(e)
         await bot.answer_callback_query(query.id, "Произошла ошибка\nКаким образом ты все сломал?\nНапиши @pihta24")
 
 
+def register_handlers(telebot: AsyncTeleBot):
+    telebot.register_message_handler(handle_coolers, commands=["coolers"])
+    telebot.register_message_handler(handle_stats, commands=["stats"])
+    telebot.register_message_handler(handle_ban, commands=["ban", "unban"])
+    telebot.register_message_handler(handle_list, commands=["banned", "admins"])
+    telebot.register_message_handler(handle_chat, commands=["chat"])
+    telebot.register_message_handler(handle_admin, commands=["admin"])
+    telebot.register_message_handler(handle_forwarded_for_admin, func=lambda message: message.forward_from is not None)
+    telebot.register_message_handler(handle_start, commands=["start"])
+    telebot.register_message_handler(photo_handler, content_types=["photo"])
+    telebot.register_callback_query_handler(handle_inline_keyboard, func=lambda query: query.message is not None)
+
+
+def create_app() -> AsyncTeleBot:
+    """
+    Создаёт клиентов телеги и БД, шлюзы и обработчики.
+    При импорте модуля ничего не подключается, поэтому импорт быстрый и без побочных эффектов.
+    """
+    global bot, client, classifier
+    bot = AsyncTeleBot(environ.get("TELEBOT_TOKEN", ""))
+    # Недоступная БД обнаруживается за DB_SELECTION_TIMEOUT мс, а не за 30 с по умолчанию
+    client = AsyncIOMotorClient(environ.get("DATABASE_URL", ""),
+                                serverSelectionTimeoutMS=int(environ.get("DB_SELECTION_TIMEOUT", 5000)),
+                                event_listeners=[MongoMetricsListener()] if metrics.enabled else [])
+
+    # Первым: обновления, которые никто не обработает, отбрасываются до запросов к БД
+    classifier = UpdateClassifierMiddleware(bot, chat_sink)
+    bot.setup_middleware(classifier)
+    if metrics.enabled:
+        bot.setup_middleware(MetricsMiddleware())  # Учитывает время остальных шлюзов
+    # Квоты на пользователя до шлюзов с запросами к БД: флуд отклоняется без регистрации и проверки бана
+    bot.setup_middleware(RateLimitMiddleware(bot, throttled))
+    bot.setup_middleware(RegisterMiddleware())  # Настройка промежуточного шлюза для регистрации пользователей
+    bot.setup_middleware(HandleBannedMiddleware(bot))  # Настройка промежуточного шлюза для проверки бана
+    register_handlers(bot)
+
+    if metrics.enabled:
+        # Обёртки ставятся только при включённых метриках, иначе накладных расходов нет
+        instrument_handlers(bot)
+        instrument_telegram()
+        metrics.collect(lambda: {
+            "users_cache_hits": users_cache.hits, "users_cache_misses": users_cache.misses,
+            "chats_cache_hits": chats_cache.hits, "chats_cache_misses": chats_cache.misses,
+            "event_sink_buffered": len(event_sink.buffer),
+            "outbox_processed": outbox_worker.processed,
+            "rate_limited": rate_limiter.rejected,
+            "db_breaker_open": int(breaker.open),
+            "db_breaker_rejected": breaker.rejected,
+            "replay_pending": len(replay_queue.items),
+            "updates_passed": classifier.passed,
+            "updates_dropped": sum(classifier.dropped.values()),
+        })
+    return bot
+
+
+async def serve_webhook():
+    # Режим webhook: aiohttp-сервер и пул обработчиков с ограниченной очередью
+    from utils.webhook import UpdateWorkerPool, WebhookServer, Shards
+
+    shards = None
+    if SHARD_COUNT > 1:
+        shards = Shards(SHARD_COUNT, int(environ["SHARD_INDEX"]), environ["SHARD_URLS"].split(","))
+    pool = UpdateWorkerPool(bot, int(environ.get("WORKERS", 8)), int(environ.get("QUEUE_SIZE", 1024)))
+    server = WebhookServer(bot, pool, environ.get("WEBHOOK_HOST", "0.0.0.0"), int(environ.get("WEBHOOK_PORT", 8080)),
+                           environ.get("WEBHOOK_PATH", "/webhook"), environ.get("WEBHOOK_SECRET"), shards=shards)
+    await server.start(environ["WEBHOOK_URL"], int(environ.get("WEBHOOK_MAX_CONNECTIONS", 40)))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        await bot.close_session()
+
+
 async def main():
+    create_app()
     await Engine().bind(motor=client, databases=[Database], inject_motyc_fields=True)
-    await bot.polling(non_stop=True)
+    await ensure_indexes()
+    await notifications.migrate_sent_messages()
+    await cooler_state.migrate_empty_since()
+    chat_to_get_photo.start_sweeper()
+    admins_actions.start_sweeper()
+    event_sink.start()
+    chat_sink.start()
+    replay_queue.start()
+    recipients.start()
+    leader.start()  # Ведущая реплика подхватывает и операции outbox, не выполненные до перезапуска
+    if metrics.enabled:
+        await start_metrics_server(environ.get("METRICS_HOST", "0.0.0.0"), int(environ["METRICS_PORT"]))
+
+    try:
+        if environ.get("WEBHOOK_URL"):
+            await serve_webhook()
+        else:
+            await bot.polling(non_stop=True)
+    finally:
+        await leader.stop()
+        await event_sink.stop()  # Дописываем накопленные события перед выходом
+        await chat_sink.stop()
+        await replay_queue.stop()
+        if "utils.qr_generator" in sys.modules:
+            # Пул процессов для QR создаётся только после первой /coolers
+            from utils.qr_generator import shutdown_executor
+            shutdown_executor()
 
 
 if __name__ == '__main__':
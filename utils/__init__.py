@@ -1,2 +1,30 @@
-from .self_cleaning_dict import SelfCleaningDict
-from .qr_generator import generate_qr_code
+from .ttl_store import TTLStore, MemoryBackend, RedisBackend, MongoBackend, make_backend
+from .dispatcher import Dispatcher
+from .debounce import Debouncer
+from .callback_data import CallbackData, CallbackRouter
+from .keyboards import report_keyboard, render_notification, render_digest, render_escalation, \
+    render_status
+from .outbox import OutboxWorker
+from .media import best_photo, send_cached_document
+from .leader import LeaderElection
+from .scheduler import Scheduler
+from .rate_limit import Quota, RateLimiter
+from .paging import PagedList, render_page
+
+# Тяжёлые модули (qrcode/PIL, aiohttp.web) загружаются при первом обращении
+_LAZY = {
+    "generate_qr_code": "qr_generator",
+    "render_qr_code": "qr_generator",
+    "render_qr_sheet": "qr_generator",
+    "forget_qr_code": "qr_generator",
+    "UpdateWorkerPool": "webhook",
+    "WebhookServer": "webhook",
+    "Shards": "webhook",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        from importlib import import_module
+        return getattr(import_module(f".{_LAZY[name]}", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,90 @@
+import struct
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from dataclasses import dataclass
+
+# Код действия — индекс в кортеже, новые действия добавляются только в конец
+ACTIONS = ("empty", "no_water", "no_glass", "no_all", "reset_water", "reset_glass", "reset_all", "take", "ban",
+           "coolers_next", "coolers_prev", "water_next", "water_prev", "glass_next", "glass_prev",
+           "banned_next", "banned_prev", "admins_next", "admins_prev")
+CODES = {name: code for code, name in enumerate(ACTIONS)}
+USER_ACTIONS = ("ban",)  # Цель — telegram_id, у остальных — id кулера
+
+MAX_LENGTH = 64  # Ограничение телеграма на callback_data в байтах
+
+
+@dataclass(frozen=True)
+class CallbackData:
+    """
+    Данные inline кнопки: действие, цель и случай, для которого кнопка нарисована.
+    Кодируются в байты (код действия, ObjectId или int64, ObjectId случая) и urlsafe base64 — не больше 34 символов.
+    Кнопки старых уведомлений в формате "id действие" разбираются как раньше, случай у них неизвестен.
+    """
+    action: str
+    target: str | int | None = None
+    incident: str | None = None  # Кнопка от закрытого случая считается устаревшей
+
+    def encode(self) -> str:
+        data = struct.pack(">B", CODES[self.action])
+        if self.target is not None:
+            data += struct.pack(">q", self.target) if self.action in USER_ACTIONS else bytes.fromhex(self.target)
+        if self.incident is not None:
+            data += bytes.fromhex(self.incident)
+        result = urlsafe_b64encode(data).rstrip(b"=").decode()
+        assert len(result) <= MAX_LENGTH
+        return result
+
+    @classmethod
+    def decode(cls, data: str) -> "CallbackData":
+        # ValueError, если данные не разобрать
+        if data == "empty":
+            return cls("empty")
+        if " " in data:
+            target, action = data.split()
+            if action not in CODES:
+                raise ValueError(f"Unknown action {action}")
+            return cls(action, int(target) if action in USER_ACTIONS else target)
+
+        try:
+            raw = urlsafe_b64decode(data + "=" * (-len(data) % 4))
+        except Exception as e:
+            raise ValueError(data) from e
+        if not raw or raw[0] >= len(ACTIONS):
+            raise ValueError(data)
+        action, raw = ACTIONS[raw[0]], raw[1:]
+        if not raw:
+            return cls(action)
+        if action in USER_ACTIONS:
+            if len(raw) != 8:
+                raise ValueError(data)
+            return cls(action, struct.unpack(">q", raw)[0])
+        if len(raw) not in (12, 24):
+            raise ValueError(data)
+        return cls(action, raw[:12].hex(), raw[12:].hex() or None)
+
+
+@dataclass(frozen=True)
+class Route:
+    function: object
+    staff: bool  # Доступно только админам и подписанным чатам
+
+
+class CallbackRouter:
+    """
+    Таблица действие -> обработчик.
+    Обработчик вызывается как function(query, payload, context).
+    """
+
+    def __init__(self):
+        self.routes: dict[str, Route] = {}
+
+    def route(self, *actions: str, staff=False):
+        def decorator(function):
+            for i in actions:
+                if i not in CODES:
+                    raise ValueError(f"Unknown action {i}")
+                self.routes[i] = Route(function, staff)
+            return function
+        return decorator
+
+    def resolve(self, action: str) -> Route | None:
+        return self.routes.get(action)
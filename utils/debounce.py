@@ -0,0 +1,44 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class Debouncer:
+    """
+    Откладывает вызов callback(key) на window секунд, повторные trigger за это время схлопываются в один вызов.
+    Пока по ключу удерживается hold(key), вызов ждёт — например, окончания первой рассылки.
+    """
+
+    def __init__(self, window: float, callback):
+        self.window = window
+        self.callback = callback
+        self.pending: dict = {}
+        self.locks: dict = {}  # key -> [lock, сколько корутин держат или ждут его]
+
+    @asynccontextmanager
+    async def hold(self, key):
+        # Блокировку удаляем только без ожидающих: после release она не занята, пока разбуженный не запустится
+        entry = self.locks.get(key)
+        if entry is None:
+            entry = self.locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.locks[key]
+
+    def trigger(self, key):
+        if key not in self.pending:
+            self.pending[key] = asyncio.create_task(self._run(key))
+
+    async def _run(self, key):
+        await asyncio.sleep(self.window)
+        async with self.hold(key):
+            # Снимаем отметку до вызова, чтобы изменения во время вызова запланировали следующий
+            del self.pending[key]
+            try:
+                await self.callback(key)
+            except Exception as e:
+                print(e)
@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+# noinspection PyPackageRequirements
+from telebot.asyncio_helper import ApiTelegramException
+
+from utils.metrics import metrics, telegram_retries, telegram_wait
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def pause(self, seconds: float):
+        # Телеграм попросил подождать, уводим ведро в минус на нужное время
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+    @property
+    def idle(self):
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class Dispatcher:
+    """
+    Рассылка запросов в телеграм с ограничением параллельности и лимитов.
+    Глобальный лимит и лимит на каждый чат реализованы через token bucket,
+    retry_after из ответа 429 учитывается для конкретного чата.
+    """
+
+    def __init__(self, concurrency=16, global_rate=30, private_rate=1, group_rate=20 / 60, retries=5,
+                 max_buckets=10000):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.global_bucket = TokenBucket(global_rate)
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.retries = retries
+        self.max_buckets = max_buckets
+        self.buckets: dict[int, TokenBucket] = {}
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.buckets.get(chat_id)
+        if bucket is None:
+            if len(self.buckets) >= self.max_buckets:
+                # Выкидываем полные ведра, они эквивалентны новым
+                self.buckets = {k: v for k, v in self.buckets.items() if not v.idle}
+            # Отрицательные id у групп и каналов
+            bucket = TokenBucket(self.group_rate if chat_id < 0 else self.private_rate, 1)
+            self.buckets[chat_id] = bucket
+        return bucket
+
+    async def call(self, function, chat_id: int, *args, **kwargs):
+        bucket = self._bucket(chat_id)
+        for attempt in range(self.retries):
+            start = time.perf_counter()
+            await bucket.acquire()
+            await self.global_bucket.acquire()
+            if metrics.enabled:
+                telegram_wait.observe(time.perf_counter() - start)
+            try:
+                async with self.semaphore:
+                    return await function(chat_id, *args, **kwargs)
+            except ApiTelegramException as e:
+                if e.error_code != 429 or attempt == self.retries - 1:
+                    raise
+                if metrics.enabled:
+                    telegram_retries.inc(method=function.__name__)
+                bucket.pause(e.result_json.get("parameters", {}).get("retry_after", 1))
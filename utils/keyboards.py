@@ -0,0 +1,94 @@
+from datetime import datetime
+
+# noinspection PyPackageRequirements
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from database import CoolerRecord
+from database.models import Cooler, Incident
+from utils.callback_data import CallbackData
+
+
+def button(text: str, action: str, target: str | int = None, incident: str = None) -> InlineKeyboardButton:
+    return InlineKeyboardButton(text, callback_data=CallbackData(action, target, incident).encode())
+
+
+def report_keyboard(uid: str, cooler: Cooler | CoolerRecord) -> InlineKeyboardMarkup:
+    # Кнопки обращения, уже зарегистрированное отсутствие не предлагаем
+    keyboard = InlineKeyboardMarkup()
+    if cooler.empty_watter:
+        return keyboard.row(button("Нет стаканчиков", "no_glass", uid))
+    if cooler.empty_glass:
+        return keyboard.row(button("Нет воды", "no_water", uid))
+    return keyboard.row(
+        button("Нет стаканчиков", "no_glass", uid),
+        button("Нет воды", "no_water", uid)
+    ).row(
+        button("Нет стаканчиков и воды", "no_all", uid)
+    )
+
+
+def render_notification(uid: str, name: str, flags: set, incident_id: str | None,
+                        incident: Incident | None) -> tuple[str, InlineKeyboardMarkup]:
+    # Подпись и клавиатура уведомления по текущему состоянию кулера и случая
+    keyboard = InlineKeyboardMarkup()
+    if flags == {"empty_watter", "empty_glass"}:
+        caption = "Закончились стаканчики и вода в кулере: "
+        keyboard.row(
+            button("Стаканчики загружены", "reset_glass", uid, incident_id),
+            button("Вода загружена", "reset_water", uid, incident_id)
+        ).row(
+            button("Вода и cтаканчики загружены", "reset_all", uid, incident_id)
+        )
+    elif "empty_watter" in flags:
+        caption = "Закончилась вода в кулере: "
+        keyboard.row(button("Вода загружена", "reset_water", uid, incident_id))
+    else:
+        caption = "Закончились стаканчики в кулере: "
+        keyboard.row(button("Стаканчики загружены", "reset_glass", uid, incident_id))
+
+    caption += f"'{name}'"
+    if incident is None:
+        keyboard.row(button("Взялся за работу", "take", uid, incident_id))
+        return caption, keyboard
+
+    caption += f"\nОтправил {incident.author}"
+    if len(incident.reporters) > 1:
+        caption += f"\nСообщили: {len(incident.reporters)}"
+    if incident.taken_by:
+        keyboard.row(button(f"Взялся: @{incident.taken_by}", "empty"))
+    else:
+        keyboard.row(button("Взялся за работу", "take", uid, incident_id))
+    if incident.reporters:
+        keyboard.row(button("Забанить", "ban", incident.reporters[0]))
+    return caption, keyboard
+
+
+def _duration(since: datetime, now: datetime) -> str:
+    hours, minutes = divmod(int((now - since).total_seconds()) // 60, 60)
+    return f"{hours} ч {minutes} мин" if hours else f"{minutes} мин"
+
+
+def _empty_line(cooler: Cooler, now: datetime) -> str:
+    if cooler.empty_watter and cooler.empty_glass:
+        line = f"'{cooler.name}': нет воды и стаканчиков"
+    else:
+        line = f"'{cooler.name}': нет {'воды' if cooler.empty_watter else 'стаканчиков'}"
+    if cooler.empty_since is not None:
+        line += f", {_duration(cooler.empty_since, now)}"
+    return line
+
+
+def render_digest(coolers: list[Cooler], now: datetime) -> str:
+    # Сводка по давно пустым кулерам, одно сообщение на получателя
+    return "Кулеры всё ещё не заполнены:\n" + "\n".join(_empty_line(i, now) for i in coolers)
+
+
+def render_escalation(cooler: Cooler, now: datetime) -> str:
+    return "Кулер давно не заполнен: " + _empty_line(cooler, now)
+
+
+def render_status(total: int, empty: list[Cooler], now: datetime) -> str:
+    text = f"Кулеров: {total}, пустых: {len(empty)}"
+    if empty:
+        text += "\n" + "\n".join(_empty_line(i, now) for i in empty)
+    return text
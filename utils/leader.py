@@ -0,0 +1,51 @@
+import asyncio
+import os
+import socket
+
+from pymongo.errors import PyMongoError
+
+from database import leases
+from database.periodic import Periodic
+
+
+class LeaderElection:
+    """
+    Выбор ведущей реплики по аренде в Mongo.
+    Ведущая реплика продлевает аренду каждые ttl / 3 секунд и выполняет on_elected,
+    при потере аренды или недоступности БД — on_lost. Обработчики могут быть обычными функциями или корутинами.
+    """
+
+    def __init__(self, name: str, on_elected, on_lost, ttl: float = 30, owner: str = None):
+        self.name = name
+        self.on_elected = on_elected
+        self.on_lost = on_lost
+        self.ttl = ttl
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.is_leader = False
+        self.renewal = Periodic(self._renew, ttl / 3, immediately=True)
+
+    @staticmethod
+    async def _call(callback):
+        result = callback()
+        if asyncio.iscoroutine(result):
+            await result
+
+    async def _renew(self):
+        try:
+            leader = await leases.acquire(self.name, self.owner, self.ttl)
+        except PyMongoError as e:
+            print(e)
+            leader = False  # Не можем продлить аренду — уступаем, пока её не забрал кто-то другой
+        if leader != self.is_leader:
+            self.is_leader = leader
+            await self._call(self.on_elected if leader else self.on_lost)
+
+    def start(self):
+        self.renewal.start()
+
+    async def stop(self):
+        await self.renewal.stop()
+        if self.is_leader:
+            self.is_leader = False
+            await self._call(self.on_lost)
+            await leases.release(self.name, self.owner)  # Другая реплика подхватит работу сразу
@@ -0,0 +1,62 @@
+from os import environ
+
+# noinspection PyPackageRequirements
+from telebot.async_telebot import AsyncTeleBot
+# noinspection PyPackageRequirements
+from telebot.asyncio_helper import ApiTelegramException
+# noinspection PyPackageRequirements
+from telebot.types import PhotoSize, Message
+
+from database import Database
+from database.models import MediaFile
+
+MAX_PHOTO_SIDE = int(environ.get("MEDIA_MAX_SIDE", 2560))
+
+_file_ids: dict[tuple[str, str], str] = {}
+
+
+def best_photo(photos: list[PhotoSize], max_side: int = MAX_PHOTO_SIDE) -> str:
+    # Размеры фотографии идут по возрастанию, берём самый большой, который не превышает max_side
+    fitting = [i for i in photos if max(i.width, i.height) <= max_side]
+    return fitting[-1].file_id if fitting else photos[0].file_id
+
+
+async def get_file_id(key: str, style: str) -> str | None:
+    file_id = _file_ids.get((key, style))
+    if file_id is None:
+        cached = await Database.media.find({"key": key, "style": style}, limit=1)
+        if cached:
+            file_id = _file_ids[(key, style)] = cached[0].file_id
+    return file_id
+
+
+async def remember_file_id(key: str, style: str, file_id: str):
+    _file_ids[(key, style)] = file_id
+    await Database.media.collection.update_one(
+        {"key": key, "style": style}, {"$set": MediaFile(key=key, style=style, file_id=file_id).dict()}, upsert=True
+    )
+
+
+async def forget_file_id(key: str):
+    for i in [i for i in _file_ids if i[0] == key]:
+        del _file_ids[i]
+    await Database.media.collection.delete_many({"key": key})
+
+
+async def send_cached_document(bot: AsyncTeleBot, chat_id: int, key: str, style: str, render, **kwargs) -> Message:
+    """
+    Отправляет документ по сохранённому file_id, без загрузки.
+    Если file_id ещё нет или телеграм его не принял, вызывает render() и загружает файл,
+    file_id из ответа запоминается для следующих отправок.
+    """
+    file_id = await get_file_id(key, style)
+    if file_id is not None:
+        try:
+            return await bot.send_document(chat_id, file_id, **kwargs)
+        except ApiTelegramException as e:
+            if e.error_code != 400:
+                raise
+            await forget_file_id(key)  # file_id устарел или выдан другому боту
+    message = await bot.send_document(chat_id, await render(), **kwargs)
+    await remember_file_id(key, style, message.document.file_id)
+    return message
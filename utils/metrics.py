@@ -0,0 +1,176 @@
+import time
+from bisect import bisect_left
+from functools import wraps
+from os import environ
+
+from pymongo import monitoring
+# noinspection PyPackageRequirements
+from telebot import asyncio_helper
+# noinspection PyPackageRequirements
+from telebot.asyncio_helper import ApiTelegramException
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _labels(labels: tuple) -> str:
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}" if labels else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(k)} {v}" for k, v in self.values.items()]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.values: dict[tuple, list] = {}  # labels -> [счётчики по корзинам..., сумма, количество]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        item = self.values.get(key)
+        if item is None:
+            item = self.values[key] = [0] * (len(self.buckets) + 2)
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            item[index] += 1
+        item[-2] += value
+        item[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, item in self.values.items():
+            total = 0
+            for bound, count in zip(self.buckets, item):
+                total += count
+                lines.append(f"{self.name}_bucket{_labels(key + (('le', bound),))} {total}")
+            lines.append(f"{self.name}_bucket{_labels(key + (('le', '+Inf'),))} {item[-1]}")
+            lines.append(f"{self.name}_sum{_labels(key)} {item[-2]}")
+            lines.append(f"{self.name}_count{_labels(key)} {item[-1]}")
+        return lines
+
+
+class Registry:
+    """
+    Метрики в формате Prometheus.
+    Когда метрики выключены, обёртки не устанавливаются, а прямые вызовы защищены проверкой enabled.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.metrics = {}
+        self.collectors = []  # Функции, которые при отдаче /metrics возвращают {имя: значение}
+
+    def counter(self, name: str, documentation: str = "") -> Counter:
+        if name not in self.metrics:
+            self.metrics[name] = Counter(name, documentation)
+        return self.metrics[name]
+
+    def histogram(self, name: str, documentation: str = "", buckets=DEFAULT_BUCKETS) -> Histogram:
+        if name not in self.metrics:
+            self.metrics[name] = Histogram(name, documentation, buckets)
+        return self.metrics[name]
+
+    def collect(self, function):
+        self.collectors.append(function)
+
+    def render(self) -> str:
+        lines = []
+        for i in self.metrics.values():
+            lines += i.render()
+        for collector in self.collectors:
+            for name, value in collector().items():
+                lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Registry(enabled=bool(environ.get("METRICS_PORT")))
+
+handler_latency = metrics.histogram("handler_latency_seconds", "Handler execution time")
+update_latency = metrics.histogram("update_latency_seconds", "Update handling time including middlewares")
+mongo_latency = metrics.histogram("mongo_latency_seconds", "MongoDB command time")
+telegram_latency = metrics.histogram("telegram_latency_seconds", "Telegram Bot API request time")
+telegram_errors = metrics.counter("telegram_errors_total", "Telegram Bot API errors by code")
+telegram_retries = metrics.counter("telegram_retries_total", "Requests retried after 429")
+telegram_wait = metrics.histogram("telegram_rate_limit_wait_seconds", "Time spent waiting for rate limits")
+fanout_size = metrics.histogram("fanout_size", "Recipients per broadcast", (1, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+
+def _timed_handler(function):
+    @wraps(function)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            handler_latency.observe(time.perf_counter() - start, handler=function.__name__)
+    return wrapper
+
+
+def instrument_handlers(bot):
+    # Оборачиваем уже зарегистрированные обработчики, wraps сохраняет сигнатуру для передачи data
+    for handlers in (bot.message_handlers, bot.callback_query_handlers):
+        for handler in handlers:
+            handler["function"] = _timed_handler(handler["function"])
+
+
+def instrument_telegram():
+    process_request = asyncio_helper._process_request
+
+    async def wrapper(token, url, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await process_request(token, url, *args, **kwargs)
+        except ApiTelegramException as e:
+            telegram_errors.inc(method=url, code=e.error_code)
+            raise
+        finally:
+            telegram_latency.observe(time.perf_counter() - start, method=url)
+
+    asyncio_helper._process_request = wrapper
+
+
+class MongoMetricsListener(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = {}
+
+    def started(self, event):
+        self.commands[event.request_id] = (event.command.get(event.command_name), event.command_name)
+
+    def _finish(self, event):
+        collection, operation = self.commands.pop(event.request_id, (None, event.command_name))
+        if isinstance(collection, str):
+            mongo_latency.observe(event.duration_micros / 1e6, collection=collection, operation=operation)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+
+async def start_metrics_server(host="0.0.0.0", port=9100):
+    from aiohttp import web
+
+    async def handle(_):
+        return web.Response(text=metrics.render(), content_type="text/plain")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
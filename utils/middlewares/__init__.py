@@ -1,2 +1,6 @@
+from .context import RequestContext
 from .register_middleware import RegisterMiddleware
 from .handle_banned_middleware import HandleBannedMiddleware
+from .metrics_middleware import MetricsMiddleware
+from .update_classifier import UpdateClassifierMiddleware
+from .rate_limit_middleware import RateLimitMiddleware
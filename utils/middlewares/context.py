@@ -0,0 +1,31 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+# noinspection PyPackageRequirements
+from telebot.types import CallbackQuery
+
+from database import UserRecord, ChatRecord
+
+
+@dataclass
+class RequestContext:
+    """
+    Данные одного обновления, которые заполняют промежуточные шлюзы.
+    Доступен в обработчиках как data["context"].
+    """
+    user: UserRecord
+    chat: ChatRecord | None = None  # Запись группового чата, для личных сообщений None
+
+    @property
+    def banned(self) -> bool:
+        # Истёкший временный бан не действует, даже если планировщик ещё не снял его в БД
+        if self.user.banned_until is not None and self.user.banned_until <= datetime.utcnow():
+            return False
+        return self.user.banned
+
+
+def get_update_chat(update):
+    # У callback_query чат берётся из сообщения с кнопками
+    if isinstance(update, CallbackQuery):
+        return update.message.chat if update.message else None
+    return update.chat
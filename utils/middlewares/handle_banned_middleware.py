@@ -2,22 +2,24 @@
 from telebot.async_telebot import AsyncTeleBot
 # noinspection PyPackageRequirements
 from telebot.asyncio_handler_backends import BaseMiddleware, CancelUpdate
-
-from database import Database
+# noinspection PyPackageRequirements
+from telebot.types import CallbackQuery
 
 
 class HandleBannedMiddleware(BaseMiddleware):
     def __init__(self, bot: AsyncTeleBot):
         super().__init__()
         self.update_sensitive = False
-        self.update_types = ['message']
+        self.update_types = ['message', 'callback_query']
         self.__bot_instance = bot
 
     async def pre_process(self, message, data):
         try:
-            user = await Database.users.find_one({"telegram_id": message.from_user.id})
-            if user.banned:
-                await self.__bot_instance.reply_to(message, "Вы находитесь в черном списке")
+            if data["context"].banned:
+                if isinstance(message, CallbackQuery):
+                    await self.__bot_instance.answer_callback_query(message.id, "Вы находитесь в черном списке")
+                else:
+                    await self.__bot_instance.reply_to(message, "Вы находитесь в черном списке")
                 return CancelUpdate()
         except Exception as e:
             print(e)
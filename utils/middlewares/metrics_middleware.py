@@ -0,0 +1,20 @@
+import time
+
+# noinspection PyPackageRequirements
+from telebot.asyncio_handler_backends import BaseMiddleware
+
+from utils.metrics import update_latency
+
+
+class MetricsMiddleware(BaseMiddleware):
+    def __init__(self):
+        super().__init__()
+        self.update_sensitive = False
+        self.update_types = ['message', 'callback_query']
+
+    async def pre_process(self, message, data):
+        data["started_at"] = time.perf_counter()
+
+    async def post_process(self, message, data, exception):
+        update_latency.observe(time.perf_counter() - data["started_at"], update_type=type(message).__name__,
+                               failed=exception is not None)
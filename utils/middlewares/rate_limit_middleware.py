@@ -0,0 +1,63 @@
+# noinspection PyPackageRequirements
+from telebot.async_telebot import AsyncTeleBot
+# noinspection PyPackageRequirements
+from telebot.asyncio_handler_backends import BaseMiddleware, CancelUpdate
+# noinspection PyPackageRequirements
+from telebot.types import CallbackQuery, Message
+# noinspection PyPackageRequirements
+from telebot.util import extract_command
+
+from database import cooler_state
+from utils.callback_data import CallbackData
+
+
+class RateLimitMiddleware(BaseMiddleware):
+    """
+    Квоты на пользователя до шлюзов, которые ходят в БД: сканирование (/start), кнопка обращения и фотография.
+    throttled(name, key, telegram_id) — True, если действие нужно отклонить; отклонённое обновление дальше не идёт.
+    """
+
+    def __init__(self, bot: AsyncTeleBot, throttled):
+        super().__init__()
+        self.update_sensitive = False
+        self.update_types = ['message', 'callback_query']
+        self.__bot_instance = bot
+        self.throttled = throttled
+
+    @staticmethod
+    def classify(update) -> str | None:
+        # Имя квоты для обновления или None, если оно не ограничивается
+        if isinstance(update, CallbackQuery):
+            try:
+                action = CallbackData.decode(update.data).action
+            except ValueError:
+                return None
+            return "report" if action in cooler_state.REPORT_FLAGS else None
+        if not isinstance(update, Message) or update.chat.type != "private":
+            return None
+        if update.content_type == "photo":
+            return "photo"
+        if update.content_type == "text" and extract_command(update.text) == "start":
+            return "start"
+        return None
+
+    async def pre_process(self, message, data):
+        name = self.classify(message)
+        if name is None:
+            return
+        try:
+            if not await self.throttled(name, message.from_user.id, message.from_user.id):
+                return
+        except Exception as e:
+            print(e)
+            return  # Без счётчиков обновление не отклоняется
+        # Сканирование и фотография отклоняются без ответа: лишний запрос к телеграму на каждый флуд
+        if isinstance(message, CallbackQuery):
+            try:
+                await self.__bot_instance.answer_callback_query(message.id, "Слишком много обращений, попробуйте позже")
+            except Exception as e:
+                print(e)
+        return CancelUpdate()
+
+    async def post_process(self, message, data, exception):
+        pass
@@ -1,27 +1,66 @@
+from pymongo.errors import DuplicateKeyError
 # noinspection PyPackageRequirements
 from telebot.asyncio_handler_backends import BaseMiddleware, CancelUpdate
 
-from database import Database
+from database import Database, get_user, get_chat, users_cache, chats_cache, breaker, DatabaseUnavailable, UserRecord, \
+    ChatRecord, projections
 from database.models import User, Chat
+from .context import RequestContext, get_update_chat
 
 
 class RegisterMiddleware(BaseMiddleware):
+    """
+    Регистрирует пользователей и групповые чаты.
+    Пока БД недоступна, берётся последнее известное состояние, а неизвестные обрабатываются как новые без записи.
+    """
+
     def __init__(self):
         super().__init__()
         self.update_sensitive = False
-        self.update_types = ['message']
+        self.update_types = ['message', 'callback_query']
 
-    async def pre_process(self, message, data):
+    @staticmethod
+    async def _user(message) -> UserRecord:
         try:
-            user = await Database.users.find({"telegram_id": message.from_user.id})
+            user = await get_user(message.from_user.id)
             if not user:
-                user = User(telegram_id=message.from_user.id, name=message.from_user.first_name)
-                await Database.users.save(user)
-            if message.chat.type in ['group', 'supergroup']:
-                chat = await Database.chats.find({"chat_id": message.chat.id})
-                if not chat:
-                    chat = Chat(chat_id=message.chat.id)
-                    await Database.chats.save(chat)
+                try:
+                    user = User(telegram_id=message.from_user.id, name=message.from_user.first_name)
+                    await breaker.call(Database.users.save(user, inject_default_id=True))
+                    user = projections.parse(UserRecord, user.dict())
+                    users_cache.set(user.telegram_id, user)
+                except DuplicateKeyError:
+                    # Параллельное обновление уже зарегистрировало пользователя
+                    users_cache.invalidate(message.from_user.id)
+                    user = await get_user(message.from_user.id)
+            return user
+        except DatabaseUnavailable:
+            return UserRecord(telegram_id=message.from_user.id, name=message.from_user.first_name)
+
+    @staticmethod
+    async def _chat(update_chat) -> ChatRecord:
+        try:
+            chat = await get_chat(update_chat.id)
+            if not chat:
+                try:
+                    await breaker.call(Database.chats.save(Chat(chat_id=update_chat.id), inject_default_id=True))
+                    chat = ChatRecord(chat_id=update_chat.id)
+                    chats_cache.set(chat.chat_id, chat)
+                except DuplicateKeyError:
+                    chats_cache.invalidate(update_chat.id)
+                    chat = await get_chat(update_chat.id)
+            return chat
+        except DatabaseUnavailable:
+            return ChatRecord(chat_id=update_chat.id)
+
+    async def pre_process(self, message, data):
+        try:
+            user = await self._user(message)
+            chat = None
+            update_chat = get_update_chat(message)
+            if update_chat and update_chat.type in ['group', 'supergroup']:
+                chat = await self._chat(update_chat)
+            data["context"] = RequestContext(user=user, chat=chat)
         except Exception as e:
             print(e)
             return CancelUpdate()
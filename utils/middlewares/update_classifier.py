@@ -0,0 +1,65 @@
+from collections import Counter
+
+# noinspection PyPackageRequirements
+from telebot.async_telebot import AsyncTeleBot
+# noinspection PyPackageRequirements
+from telebot.asyncio_handler_backends import BaseMiddleware, CancelUpdate
+# noinspection PyPackageRequirements
+from telebot.types import CallbackQuery, Message
+# noinspection PyPackageRequirements
+from telebot.util import extract_command
+
+from database import ChatSink
+
+
+class UpdateClassifierMiddleware(BaseMiddleware):
+    """
+    Отбрасывает обновления, на которые не ответит ни один обработчик, до остальных шлюзов и без запросов к БД:
+    в группах действуют только команды, в личных сообщениях ещё фотографии и пересланные сообщения.
+    Групповые чаты из отброшенных сообщений регистрируются пачкой через ChatSink.
+    """
+
+    def __init__(self, bot: AsyncTeleBot, chat_sink: ChatSink):
+        super().__init__()
+        self.update_sensitive = False
+        self.update_types = ['message', 'callback_query']
+        self.__bot_instance = bot
+        self.chat_sink = chat_sink
+        self.commands = None
+        self.passed = 0
+        self.dropped = Counter()  # Причина -> количество
+
+    def _commands(self) -> set[str]:
+        # Команды берутся из зарегистрированных обработчиков, которые добавляются после шлюзов
+        if self.commands is None:
+            self.commands = {command for handler in self.__bot_instance.message_handlers
+                             for command in handler["filters"].get("commands") or ()}
+        return self.commands
+
+    def classify(self, update) -> str | None:
+        # None, если обновление нужно обработать, иначе причина
+        if isinstance(update, CallbackQuery):
+            return None if update.message is not None else "callback_without_message"
+        if not isinstance(update, Message):
+            return None
+        command = extract_command(update.text) if update.content_type == "text" else None
+        if command is not None and command in self._commands():
+            return None
+        if update.chat.type != "private":
+            return "group"
+        if update.content_type == "photo" or update.forward_from is not None:
+            return None
+        return "private"
+
+    async def pre_process(self, message, data):
+        reason = self.classify(message)
+        if reason is None:
+            self.passed += 1
+            return
+        self.dropped[reason] += 1
+        if reason == "group" and message.chat.type in ['group', 'supergroup']:
+            self.chat_sink.add(message.chat.id)
+        return CancelUpdate()
+
+    async def post_process(self, message, data, exception):
+        pass
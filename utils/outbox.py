@@ -0,0 +1,152 @@
+import asyncio
+import random
+from dataclasses import dataclass
+
+# noinspection PyPackageRequirements
+from telebot.asyncio_helper import ApiTelegramException
+
+from database import outbox
+from utils.dispatcher import Dispatcher
+
+
+@dataclass
+class Operation:
+    function: object  # function(chat_id, *args, **kwargs)
+    done: object = None  # done(item, result, stale), stale — аргументы заменили во время выполнения
+    failed: object = None  # failed([(item, error), ...]) — неисправимые ошибки и исчерпанные попытки за проход
+
+
+class OutboxWorker:
+    """
+    Выполняет операции из outbox через Dispatcher.
+    429, ошибки 5xx и сетевые ошибки повторяются с экспоненциальной задержкой,
+    остальные ошибки телеграма считаются окончательными.
+    Операции выполняются хотя бы один раз: после падения посреди запроса операция повторится по окончании аренды.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, workers=4, batch=100, poll=1.0, lease=60.0, max_attempts=8,
+                 base_delay=1.0, max_delay=300.0):
+        self.dispatcher = dispatcher
+        self.workers = workers
+        self.batch = batch
+        self.poll = poll
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.operations: dict[str, Operation] = {}
+        self.wakeup = asyncio.Event()
+        self.tasks = []
+        self.stopping = False
+        self.processed = 0
+
+    def register(self, method: str, function, done=None, failed=None):
+        self.operations[method] = Operation(function, done, failed)
+
+    async def enqueue(self, items: list):
+        await outbox.enqueue(items)
+        self.wakeup.set()
+
+    def _delay(self, attempts: int) -> float:
+        delay = min(self.base_delay * 2 ** attempts, self.max_delay)
+        return delay * random.uniform(0.5, 1)  # Разброс, чтобы повторы не приходили пачкой
+
+    @staticmethod
+    def _retryable(error: Exception) -> bool:
+        if isinstance(error, ApiTelegramException):
+            return error.error_code == 429 or error.error_code >= 500
+        return True  # Сетевые ошибки и таймауты
+
+    async def _execute(self, item: dict, failures: list):
+        operation = self.operations.get(item["method"])
+        if operation is None:
+            await outbox.fail(item, f"Unknown method {item['method']}")
+            return
+        try:
+            result = await self.dispatcher.call(operation.function, item["chat_id"], *item["args"], **item["kwargs"])
+        except ApiTelegramException as e:
+            if "message is not modified" in e.description:
+                result = None  # Сообщение уже в нужном виде
+            elif not self._retryable(e) or item["attempts"] + 1 >= self.max_attempts:
+                await outbox.fail(item, str(e))
+                failures.append((item, e))
+                return
+            else:
+                await outbox.retry(item, self._delay(item["attempts"]), str(e))
+                return
+        except Exception as e:
+            print(e)
+            if item["attempts"] + 1 >= self.max_attempts:
+                await outbox.fail(item, str(e))
+                failures.append((item, e))
+            else:
+                await outbox.retry(item, self._delay(item["attempts"]), str(e))
+            return
+
+        stale = not await outbox.complete(item)
+        self.processed += 1
+        if operation.done is not None:
+            await operation.done(item, result, stale)
+
+    async def _safe_execute(self, item: dict, failures: list):
+        try:
+            await self._execute(item, failures)
+        except Exception as e:
+            # Ошибка записи в БД: операция останется running и будет перезапущена после аренды
+            print(e)
+
+    async def _report(self, failures: list):
+        # Ошибки передаются операции одним списком на проход, чтобы обработчик мог записать их одним запросом
+        by_method = {}
+        for item, error in failures:
+            by_method.setdefault(item["method"], []).append((item, error))
+        for method, group in by_method.items():
+            operation = self.operations[method]
+            if operation.failed is None:
+                continue
+            try:
+                await operation.failed(group)
+            except Exception as e:
+                print(e)
+
+    async def drain(self) -> int:
+        # Выполняет готовые операции, пока они есть; возвращает количество
+        count = 0
+        while not self.stopping:
+            items = await outbox.claim(self.batch, self.lease)
+            if not items:
+                break
+            failures = []
+            await asyncio.gather(*[self._safe_execute(i, failures) for i in items])
+            await self._report(failures)
+            count += len(items)
+        return count
+
+    async def _work(self):
+        while not self.stopping:
+            self.wakeup.clear()
+            try:
+                await self.drain()
+            except Exception as e:
+                print(e)
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.poll)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        # Вызывается при старте: незавершённые до перезапуска операции подхватываются первым же проходом
+        if not self.tasks:
+            self.stopping = False
+            self.tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10):
+        # Дорабатываем уже взятые операции, новые не берём
+        self.stopping = True
+        self.wakeup.set()
+        if self.tasks:
+            done, running = await asyncio.wait(self.tasks, timeout=timeout)
+            for i in running:
+                i.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+            self.tasks = []
@@ -0,0 +1,36 @@
+from dataclasses import dataclass
+
+# noinspection PyPackageRequirements
+from telebot.types import InlineKeyboardMarkup
+
+from database import paging
+from utils.keyboards import button
+
+
+@dataclass(frozen=True)
+class PagedList:
+    """
+    Список для постраничного просмотра с кнопками ◀ ▶.
+    Кнопки — действия name_prev и name_next с _id крайнего документа страницы.
+    """
+    name: str
+    title: str
+    collection: object  # Коллекция pymotyc
+    query: dict
+    projection: dict  # Читаются только поля для строки списка
+    line: object  # line(document) -> str
+
+
+async def render_page(paged: PagedList, size: int, after: str = None, before: str = None) \
+        -> tuple[str, InlineKeyboardMarkup]:
+    result = await paging.page(paged.collection, paged.query, paged.projection, size, after, before)
+    text = paged.title + ":\n" + ("\n".join(paged.line(i) for i in result.items) if result.items else "нет")
+    keyboard = InlineKeyboardMarkup()
+    buttons = []
+    if result.items and result.has_prev:
+        buttons.append(button("◀", f"{paged.name}_prev", str(result.items[0]["_id"])))
+    if result.items and result.has_next:
+        buttons.append(button("▶", f"{paged.name}_next", str(result.items[-1]["_id"])))
+    if buttons:
+        keyboard.row(*buttons)
+    return text, keyboard
@@ -1,27 +1,162 @@
+import asyncio
+import hashlib
 import io
-from os import getcwd
+from concurrent.futures import ProcessPoolExecutor
+from os import getcwd, environ
 from os.path import join
 
-from qrcode.main import QRCode
-from qrcode.constants import ERROR_CORRECT_H
-from qrcode.image.styledpil import StyledPilImage
-from qrcode.image.styles.moduledrawers import RoundedModuleDrawer
-from qrcode.image.styles.colormasks import RadialGradiantColorMask
+from database import Database
+from database.models import QrCode
+from utils.media import forget_file_id
+
+# qrcode и PIL импортируются внутри функций отрисовки: удаление кулера не должно их загружать
+QR_STYLE = "rounded-radial-logo-v1"  # Меняется вместе с оформлением, чтобы не отдавать старые коды из кэша
+
+_style = None  # Логотип и объекты оформления загружаются один раз на процесс
+_style_hash = None
+_executor = None
+_memory: dict[str, bytes] = {}
+_font = False  # Шрифт подписей на листе, None — не найден
+
+
+def _get_style():
+    global _style
+    if _style is None:
+        from PIL import Image
+        from qrcode.image.styles.moduledrawers import RoundedModuleDrawer
+        from qrcode.image.styles.colormasks import RadialGradiantColorMask
+
+        logo = Image.open(join(getcwd(), "logo.png"))
+        logo.load()
+        _style = {
+            "module_drawer": RoundedModuleDrawer(),
+            "color_mask": RadialGradiantColorMask(back_color=(255, 255, 255, 0), center_color=(0, 0, 0, 255),
+                                                  edge_color=(0, 0, 255, 255)),
+            "embeded_image": logo,
+        }
+    return _style
+
+
+def style_hash() -> str:
+    # Хэш оформления для кэша file_id: меняется вместе с QR_STYLE или логотипом
+    global _style_hash
+    if _style_hash is None:
+        with open(join(getcwd(), "logo.png"), "rb") as f:
+            _style_hash = hashlib.sha1(QR_STYLE.encode() + f.read()).hexdigest()[:16]
+    return _style_hash
+
+
+def _get_font():
+    global _font
+    if _font is False:
+        from PIL import ImageFont
+
+        try:
+            _font = ImageFont.truetype(environ.get("QR_FONT", "DejaVuSans.ttf"), 28)
+        except OSError:
+            _font = None  # Встроенный шрифт не умеет кириллицу, подписать можно только латиницу
+    return _font
+
+
+def can_label(names: list[str]) -> bool:
+    # Без шрифта с кириллицей лист не подписать, тогда коды отправляются по одному с названием в подписи
+    return _get_font() is not None or all(i.isascii() for i in names)
+
+
+def sheet_key(coolers: list[tuple[str, str]]) -> str:
+    # Ключ PDF со всеми кодами: меняется при добавлении, удалении или переименовании кулера
+    return "sheet:" + hashlib.sha1(repr(coolers).encode()).hexdigest()[:16]
 
 
 def generate_qr_code(uid: str) -> bytes:
+    from qrcode.main import QRCode
+    from qrcode.constants import ERROR_CORRECT_H
+    from qrcode.image.styledpil import StyledPilImage
+
     qr = QRCode(
         error_correction=ERROR_CORRECT_H
     )
     qr.add_data("https://t.me/GlassMonitor1502Bot?start=" + uid)
     qr.make(fit=True)
-    img = qr.make_image(
-        image_factory=StyledPilImage,
-        module_drawer=RoundedModuleDrawer(),
-        color_mask=RadialGradiantColorMask(back_color=(255, 255, 255, 0), center_color=(0, 0, 0, 255), edge_color=(0, 0, 255, 255)),
-        embeded_image_path=join(getcwd(), "logo.png"),
-    )
+    img = qr.make_image(image_factory=StyledPilImage, **_get_style())
     buf = io.BytesIO()
     img.save(buf, format='PNG')
     byte_im = buf.getvalue()
     return byte_im
+
+
+def generate_qr_sheet(codes: list[tuple[str, bytes]], columns=2, rows=3) -> bytes:
+    # Печатный PDF: по columns * rows кодов на страницу A4 (150 dpi) с подписями
+    from PIL import Image, ImageDraw
+
+    page_size, margin, caption = (1240, 1754), 60, 40
+    cell_w = (page_size[0] - 2 * margin) // columns
+    cell_h = (page_size[1] - 2 * margin) // rows
+    side = min(cell_w, cell_h - caption)
+    font = _get_font()
+
+    pages = []
+    for n, (name, png) in enumerate(codes):
+        if n % (columns * rows) == 0:
+            pages.append(Image.new("RGB", page_size, "white"))
+        page = pages[-1]
+        x = margin + (n % columns) * cell_w
+        y = margin + (n // columns % rows) * cell_h
+        code = Image.open(io.BytesIO(png)).convert("RGBA").resize((side, side))
+        page.paste(code, (x + (cell_w - side) // 2, y), code)
+        if font or name.isascii():
+            ImageDraw.Draw(page).text((x + cell_w // 2, y + side + caption // 2), name, fill="black", anchor="mm",
+                                      font=font)
+
+    buf = io.BytesIO()
+    pages[0].save(buf, format="PDF", save_all=True, append_images=pages[1:])
+    return buf.getvalue()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(int(environ.get("QR_WORKERS", 2)))
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+async def render_qr_code(uid: str) -> bytes:
+    """
+    QR-код кулера: из памяти, из БД или отрисованный в пуле процессов.
+    """
+    png = _memory.get(uid)
+    if png is None:
+        cached = await Database.qr_codes.find({"cooler_id": uid, "style": QR_STYLE}, limit=1)
+        if cached:
+            png = cached[0].png
+        else:
+            png = await asyncio.get_running_loop().run_in_executor(_get_executor(), generate_qr_code, uid)
+            # Два админа могут отрисовать один код одновременно: второй не должен упасть на уникальном индексе
+            await Database.qr_codes.collection.update_one(
+                {"cooler_id": uid, "style": QR_STYLE},
+                {"$setOnInsert": QrCode(cooler_id=uid, style=QR_STYLE, png=png).dict()},
+                upsert=True
+            )
+        _memory[uid] = png
+    return png
+
+
+async def render_qr_sheet(coolers: list[tuple[str, str]]) -> bytes:
+    # coolers — пары (id, название)
+    pngs = await asyncio.gather(*[render_qr_code(uid) for uid, _ in coolers])
+    return await asyncio.get_running_loop().run_in_executor(
+        _get_executor(), generate_qr_sheet, [(name, png) for (_, name), png in zip(coolers, pngs)]
+    )
+
+
+async def forget_qr_code(uid: str):
+    _memory.pop(uid, None)
+    await Database.qr_codes.collection.delete_many({"cooler_id": uid})
+    await forget_file_id(uid)
@@ -0,0 +1,44 @@
+import time
+from dataclasses import dataclass
+
+from utils.ttl_store import MemoryBackend
+
+
+@dataclass(frozen=True)
+class Quota:
+    limit: int
+    window: float  # Секунды
+
+    @classmethod
+    def parse(cls, value: str) -> "Quota":
+        # Формат "количество/секунды", например "5/600"
+        limit, window = value.split("/")
+        return cls(int(limit), float(window))
+
+
+class RateLimiter:
+    """
+    Скользящее окно по квотам: счётчик текущего фиксированного окна плюс счётчик прошлого
+    с весом ещё не прошедшей его доли. Два счётчика на ключ вместо списка отметок времени.
+    Счётчики в памяти процесса или в общем хранилище из make_backend.
+    """
+
+    def __init__(self, quotas: dict[str, Quota], backend=None):
+        self.quotas = quotas
+        self.backend = backend if backend is not None else MemoryBackend(100000)
+        self.rejected = 0
+
+    async def hit(self, name: str, key) -> float:
+        # Учитывает действие и возвращает оценку количества действий за окно, включая это
+        quota = self.quotas[name]
+        window, offset = divmod(time.time(), quota.window)
+        current = await self.backend.incr(f"{name}:{key}:{int(window)}", quota.window * 2)
+        previous = await self.backend.get(f"{name}:{key}:{int(window) - 1}") or 0
+        return current + previous * (1 - offset / quota.window)
+
+    async def check(self, name: str, key) -> float:
+        # Загрузка квоты: больше 1 — действие нужно отклонить
+        load = await self.hit(name, key) / self.quotas[name].limit
+        if load > 1:
+            self.rejected += 1
+        return load
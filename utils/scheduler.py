@@ -0,0 +1,42 @@
+import time
+from dataclasses import dataclass
+
+from database import ticks
+from database.periodic import Periodic
+
+
+@dataclass
+class Job:
+    function: object  # function(slot), slot — номер периода
+    period: float
+
+
+class Scheduler:
+    """
+    Периодические задачи, проверяются каждые tick секунд.
+    Выполненный период отмечается в БД, поэтому после перезапуска или смены ведущей реплики он не повторяется.
+    """
+
+    def __init__(self, tick: float = 60):
+        self.tick = tick
+        self.jobs: dict[str, Job] = {}
+        self.loop = Periodic(self.run_pending, tick, immediately=True)
+
+    def add(self, name: str, period: float, function):
+        self.jobs[name] = Job(function, period)
+
+    async def run_pending(self):
+        now = time.time()
+        for name, job in self.jobs.items():
+            slot = int(now // job.period)
+            try:
+                if await ticks.claim(name, slot):
+                    await job.function(slot)
+            except Exception as e:
+                print(e)  # Упавший период не повторяется, следующий выполнится как обычно
+
+    def start(self):
+        self.loop.start()
+
+    async def stop(self):
+        await self.loop.stop()
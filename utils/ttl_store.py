@@ -0,0 +1,198 @@
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+
+from database.periodic import Periodic
+
+
+class MemoryBackend:
+    """
+    Хранилище в памяти процесса.
+    Ключи упорядочены по времени истечения (перезапись переносит ключ в конец),
+    поэтому очистка снимает просроченные элементы только с начала — амортизированно O(1) на элемент.
+    """
+
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size
+        self.data = OrderedDict()  # key -> (value, expires_at)
+
+    async def get(self, key):
+        item = self.data.get(key)
+        if item is None:
+            return None
+        if item[1] < time.monotonic():
+            del self.data[key]
+            return None
+        return item[0]
+
+    async def set(self, key, value, ttl: float):
+        self.data[key] = (value, time.monotonic() + ttl)
+        self.data.move_to_end(key)
+        if self.max_size and len(self.data) > self.max_size:
+            self.data.popitem(last=False)
+
+    async def pop(self, key):
+        item = self.data.pop(key, None)
+        if item is None or item[1] < time.monotonic():
+            return None
+        return item[0]
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def incr(self, key, ttl: float) -> int:
+        # Срок жизни задаётся первым увеличением и дальше не продлевается
+        item = self.data.get(key)
+        if item is None or item[1] < time.monotonic():
+            await self.set(key, 1, ttl)
+            return 1
+        self.data[key] = (item[0] + 1, item[1])
+        return item[0] + 1
+
+    async def sweep(self) -> int:
+        cur = time.monotonic()
+        removed = 0
+        while self.data:
+            key, (_, expires_at) = next(iter(self.data.items()))
+            if expires_at >= cur:
+                break
+            del self.data[key]
+            removed += 1
+        return removed
+
+    def __len__(self):
+        return len(self.data)
+
+
+class RedisBackend:
+    """
+    Общее для нескольких реплик хранилище в Redis (или совместимом сервере).
+    Истечением занимается сам сервер, значения сериализуются в JSON.
+    """
+
+    def __init__(self, url: str, prefix: str = ""):
+        # redis — необязательная зависимость (pipenv install --categories redis), нужна только при STATE_URL=redis://...
+        from redis.asyncio import from_url
+
+        self.redis = from_url(url)
+        self.prefix = prefix
+
+    def _key(self, key):
+        return f"{self.prefix}{key}"
+
+    async def get(self, key):
+        value = await self.redis.get(self._key(key))
+        return None if value is None else json.loads(value)
+
+    async def set(self, key, value, ttl: float):
+        await self.redis.set(self._key(key), json.dumps(value), px=int(ttl * 1000))
+
+    async def pop(self, key):
+        value = await self.redis.getdel(self._key(key))
+        return None if value is None else json.loads(value)
+
+    async def delete(self, key):
+        await self.redis.delete(self._key(key))
+
+    async def incr(self, key, ttl: float) -> int:
+        async with self.redis.pipeline() as pipe:
+            value, _ = await pipe.incr(self._key(key)).pexpire(self._key(key), int(ttl * 1000), nx=True).execute()
+        return value
+
+    async def sweep(self) -> int:
+        return 0
+
+
+class MongoBackend:
+    """
+    Общее для нескольких реплик хранилище в коллекции основной БД.
+    Просроченные документы удаляет TTL-индекс, до удаления их отсекает условие на expires_at.
+    С breaker запросы идут через автомат: пока БД недоступна, они сразу завершаются DatabaseUnavailable.
+    """
+
+    def __init__(self, collection, prefix: str = "", breaker=None):
+        self.collection = collection  # Коллекция pymotyc, к БД она привязывается позже
+        self.prefix = prefix
+        self.breaker = breaker
+
+    async def _call(self, awaitable):
+        return await (awaitable if self.breaker is None else self.breaker.call(awaitable))
+
+    def _key(self, key):
+        return f"{self.prefix}{key}"
+
+    async def get(self, key):
+        document = await self._call(self.collection.collection.find_one(
+            {"_id": self._key(key), "expires_at": {"$gt": datetime.utcnow()}}
+        ))
+        return None if document is None else document["value"]
+
+    async def set(self, key, value, ttl: float):
+        await self._call(self.collection.collection.update_one(
+            {"_id": self._key(key)},
+            {"$set": {"value": value, "expires_at": datetime.utcnow() + timedelta(seconds=ttl)}},
+            upsert=True
+        ))
+
+    async def pop(self, key):
+        document = await self._call(self.collection.collection.find_one_and_delete(
+            {"_id": self._key(key), "expires_at": {"$gt": datetime.utcnow()}}
+        ))
+        return None if document is None else document["value"]
+
+    async def delete(self, key):
+        await self._call(self.collection.collection.delete_one({"_id": self._key(key)}))
+
+    async def incr(self, key, ttl: float) -> int:
+        # Ключ не должен использоваться снова после истечения: документ мог ещё не удалиться
+        document = await self._call(self.collection.collection.find_one_and_update(
+            {"_id": self._key(key)},
+            {"$inc": {"value": 1}, "$setOnInsert": {"expires_at": datetime.utcnow() + timedelta(seconds=ttl)}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        ))
+        return document["value"]
+
+    async def sweep(self) -> int:
+        return 0
+
+
+def make_backend(url: str = None, prefix: str = "", max_size: int = 10000):
+    if url and url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url, prefix)
+    if url == "mongo":
+        from database import Database, breaker
+
+        return MongoBackend(Database.state, prefix, breaker)
+    return MemoryBackend(max_size)
+
+
+class TTLStore:
+    """
+    Словарь с ограничением времени жизни значений поверх заменяемого хранилища.
+    Для хранилища в памяти можно запустить фоновую очистку через start_sweeper().
+    """
+
+    def __init__(self, ttl: float = 3600, backend=None, max_size: int = 10000, sweep_interval: float = None):
+        if not ttl:
+            raise ValueError("Timeout cannot be None")
+        self.ttl = ttl
+        self.backend = backend if backend is not None else MemoryBackend(max_size)
+        self.sweeper = Periodic(self.backend.sweep, sweep_interval or ttl / 10)
+
+    async def get(self, key):
+        return await self.backend.get(key)
+
+    async def set(self, key, value):
+        await self.backend.set(key, value, self.ttl)
+
+    async def pop(self, key):
+        return await self.backend.pop(key)
+
+    async def delete(self, key):
+        await self.backend.delete(key)
+
+    def start_sweeper(self):
+        return self.sweeper.start()
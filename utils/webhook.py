@@ -0,0 +1,171 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, web
+# noinspection PyPackageRequirements
+from telebot.async_telebot import AsyncTeleBot
+# noinspection PyPackageRequirements
+from telebot.types import Update
+
+
+def update_key(update: Update) -> int:
+    # Обновления одного пользователя (или чата, если пользователя нет) обрабатываются по порядку
+    for event in (update.message, update.edited_message, update.callback_query, update.my_chat_member):
+        if event is not None:
+            if event.from_user is not None:
+                return event.from_user.id
+            return event.chat.id
+    return update.update_id
+
+
+@dataclass
+class Shards:
+    """
+    Разбиение обновлений между репликами: обновление обрабатывает реплика update_key(update) % count.
+    urls — адреса webhook-серверов всех реплик по порядку, включая текущую.
+    """
+    count: int
+    index: int
+    urls: list[str]
+
+    def owner(self, update: Update) -> int:
+        return update_key(update) % self.count
+
+
+FORWARDED_HEADER = "X-Shard-Forwarded"
+
+
+class UpdateWorkerPool:
+    """
+    Ограниченная очередь обновлений и N обработчиков.
+    Каждый обработчик владеет своей очередью, обновления раскладываются по ключу update_key,
+    поэтому обновления одного пользователя идут последовательно, а разных — параллельно.
+    """
+
+    def __init__(self, bot: AsyncTeleBot, workers=8, queue_size=1024):
+        self.bot = bot
+        self.queues = [asyncio.Queue(max(queue_size // workers, 1)) for _ in range(workers)]
+        self.tasks = []
+        self.latencies = deque(maxlen=10000)  # Время от приёма до окончания обработки
+
+    def start(self):
+        self.tasks = [asyncio.create_task(self._worker(i)) for i in self.queues]
+
+    async def put(self, update: Update, timeout: float = None) -> bool:
+        # Ждём места в очереди не дольше timeout, False — очередь переполнена
+        queue = self.queues[update_key(update) % len(self.queues)]
+        try:
+            await asyncio.wait_for(queue.put((update, time.perf_counter())), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _process(self, queue: asyncio.Queue, item):
+        update, received = item
+        try:
+            await self.bot.process_new_updates([update])
+        except Exception as e:
+            print(e)
+        finally:
+            self.latencies.append(time.perf_counter() - received)
+            queue.task_done()
+
+    async def _worker(self, queue: asyncio.Queue):
+        try:
+            while True:
+                item = await queue.get()
+                task = asyncio.ensure_future(self._process(queue, item))
+                try:
+                    await asyncio.shield(task)
+                except asyncio.CancelledError:
+                    await task
+                    raise
+        except asyncio.CancelledError:
+            # При остановке дорабатываем то, что уже принято
+            while not queue.empty():
+                await self._process(queue, queue.get_nowait())
+            raise
+
+    async def join(self):
+        await asyncio.gather(*[i.join() for i in self.queues])
+
+    async def drain(self):
+        await self.join()
+        for i in self.tasks:
+            i.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+class WebhookServer:
+    """
+    Принимает обновления от телеграма.
+    С shards обновление чужой реплики пересылается ей, а если она недоступна — обрабатывается на месте:
+    состояние диалогов общее, поэтому нарушается только порядок обработки.
+    """
+
+    def __init__(self, bot: AsyncTeleBot, pool: UpdateWorkerPool, host="0.0.0.0", port=8080, path="/webhook",
+                 secret_token: str = None, put_timeout=5, shards: Shards = None):
+        self.bot = bot
+        self.pool = pool
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.put_timeout = put_timeout
+        self.shards = shards
+        self.runner = None
+        self.session = None
+        self.forwarded = 0
+        self.fallbacks = 0
+
+        self.app = web.Application()
+        self.app.router.add_post(path, self.handle)
+
+    async def _forward(self, shard: int, payload: dict) -> bool:
+        headers = {FORWARDED_HEADER: "1"}
+        if self.secret_token:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = self.secret_token
+        try:
+            async with self.session.post(self.shards.urls[shard].rstrip("/") + self.path, json=payload,
+                                         headers=headers) as response:
+                return response.status == 200
+        except (ClientError, asyncio.TimeoutError) as e:
+            print(e)
+            return False
+
+    async def handle(self, request: web.Request):
+        if self.secret_token and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != self.secret_token:
+            return web.Response(status=403)
+        payload = await request.json()
+        update = Update.de_json(payload)
+        if self.shards is not None and not request.headers.get(FORWARDED_HEADER):
+            shard = self.shards.owner(update)
+            if shard != self.shards.index:
+                if await self._forward(shard, payload):
+                    self.forwarded += 1
+                    return web.Response()
+                self.fallbacks += 1
+        if not await self.pool.put(update, self.put_timeout):
+            # Очередь переполнена, телеграм повторит запрос позже
+            return web.Response(status=503)
+        return web.Response()
+
+    async def start(self, url: str = None, max_connections: int = None):
+        self.pool.start()
+        if self.shards is not None:
+            self.session = ClientSession(timeout=ClientTimeout(total=self.put_timeout))
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        if url:
+            await self.bot.set_webhook(url=url.rstrip("/") + self.path, secret_token=self.secret_token,
+                                       max_connections=max_connections)
+
+    async def stop(self):
+        # Сначала перестаём принимать обновления, потом дорабатываем очередь
+        await self.runner.cleanup()
+        await self.pool.drain()
+        if self.session is not None:
+            await self.session.close()